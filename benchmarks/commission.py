@@ -0,0 +1,75 @@
+"""Benchmark: table-driven commission vs the old if/elif ladder.
+
+Times the ladder, quote() and quote_many() over every cent amount up to
+--max. That both give exactly the same results is checked by
+tests/test_commission.py.
+
+Usage:
+    python -m benchmarks.commission [--max 1000] [--repeat 5]
+"""
+import argparse
+import time
+from decimal import Decimal
+from typing import Callable, Tuple
+
+from bot.utils.commission import DEFAULT_SCHEDULE
+
+
+def legacy_calculate_commission(base_amount: Decimal) -> Tuple[Decimal, Decimal]:
+    """calculate_commission as it was before the tier table."""
+    amount = float(base_amount)
+
+    if amount <= 10:
+        rate = Decimal("15.0")
+        commission = max(base_amount * rate / 100, Decimal("1.5"))
+    elif amount <= 20:
+        rate = Decimal("12.0")
+        commission = max(base_amount * rate / 100, Decimal("1.5"))
+    elif amount <= 35:
+        rate = Decimal("10.0")
+        commission = base_amount * rate / 100
+    elif amount <= 50:
+        rate = Decimal("8.0")
+        commission = base_amount * rate / 100
+    elif amount <= 75:
+        rate = Decimal("6.0")
+        commission = base_amount * rate / 100
+    elif amount <= 250:
+        rate = Decimal("5.0")
+        commission = base_amount * rate / 100
+    else:
+        rate = Decimal("3.0")
+        commission = base_amount * rate / 100
+
+    return rate, commission
+
+
+def timed(function: Callable[[], object], repeat: int) -> float:
+    """Best wall time of function over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max", type=int, default=1000, help="time every cent amount up to this")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    amounts = [Decimal(cents).scaleb(-2) for cents in range(-100, args.max * 100 + 1)]
+    print(f"{len(amounts)} amounts, best of {args.repeat}")
+    print(f"{'implementation':<24}{'µs/amount':>12}")
+    for name, function in (
+        ("if/elif ladder", lambda: [legacy_calculate_commission(amount) for amount in amounts]),
+        ("quote()", lambda: [DEFAULT_SCHEDULE.quote(amount) for amount in amounts]),
+        ("quote_many()", lambda: DEFAULT_SCHEDULE.quote_many(amounts))
+    ):
+        print(f"{name:<24}{timed(function, args.repeat) / len(amounts) * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Microbenchmark: building Order/User models from asyncpg records.
+
+Compares the slotted models with positional from_record against the
+previous dict-backed models with keyed record lookups, on real records
+generated by Postgres (no tables needed).
+
+Usage:
+    python -m benchmarks.models [--dsn DSN] [--rows 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import asyncpg
+
+from bot.config import load_config
+from bot.models.order import Order, ORDER_COLUMNS
+from bot.models.user import User, USER_COLUMNS
+
+ORDER_ROWS = f"""
+    SELECT {ORDER_COLUMNS} FROM (
+        SELECT
+            g AS id,
+            g % 1000 AS user_id,
+            'service ' || g AS service_name,
+            (g % 500 + 1)::numeric(10, 2) AS base_amount,
+            5.00::numeric(5, 2) AS commission_rate,
+            ((g % 500 + 1) * 0.05)::numeric(10, 2) AS commission_amount,
+            ((g % 500 + 1) * 1.05)::numeric(10, 2) AS total_amount,
+            'CARD' AS payment_method,
+            ((g % 500 + 1) * 100.275)::numeric(12, 2) AS payment_amount,
+            'RUB' AS payment_currency,
+            'PAID_USER' AS status,
+            NOW() - g * INTERVAL '1 minute' AS created_at,
+            NOW() AS paid_at,
+            NULL::timestamp AS completed_at,
+            NOW() AS updated_at,
+            95.5000::numeric(12, 4) AS exchange_rate,
+            NULL::varchar AS idempotency_key
+        FROM generate_series(1, $1) g
+    ) rows
+"""
+
+USER_ROWS = f"""
+    SELECT {USER_COLUMNS} FROM (
+        SELECT
+            g::bigint AS telegram_id,
+            'user' || g AS username,
+            'Name ' || g AS first_name,
+            'ru' AS language,
+            FALSE AS is_blocked,
+            NOW() AS created_at,
+            NOW() AS updated_at
+        FROM generate_series(1, $1) g
+    ) rows
+"""
+
+
+class LegacyOrder:
+    """Order model as it was before slots: instance __dict__, keyed lookups."""
+
+    # Same assignments as Order, stored in the instance __dict__
+    __init__ = Order.__init__
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            id=record["id"],
+            user_id=record["user_id"],
+            service_name=record["service_name"],
+            base_amount=record["base_amount"],
+            commission_rate=record["commission_rate"],
+            commission_amount=record["commission_amount"],
+            total_amount=record["total_amount"],
+            payment_method=record["payment_method"],
+            payment_amount=record["payment_amount"],
+            payment_currency=record["payment_currency"],
+            status=record["status"],
+            created_at=record["created_at"],
+            paid_at=record["paid_at"],
+            completed_at=record["completed_at"],
+            updated_at=record["updated_at"],
+            exchange_rate=record["exchange_rate"],
+            idempotency_key=record["idempotency_key"]
+        )
+
+
+class LegacyUser:
+    """User model as it was before slots."""
+
+    __init__ = User.__init__
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            telegram_id=record["telegram_id"],
+            username=record["username"],
+            first_name=record["first_name"],
+            language=record["language"],
+            is_blocked=record["is_blocked"],
+            created_at=record["created_at"],
+            updated_at=record["updated_at"]
+        )
+
+
+def measure(model, records, repeat: int):
+    """Return best construction time per row (µs) and memory per instance (bytes)."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        [model.from_record(record) for record in records]
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    models = [model.from_record(record) for record in records]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Exclude the list holding the models
+    size -= models.__sizeof__()
+    return best / len(records) * 1e6, size / len(records)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", help="Postgres DSN (default: from .env)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    connection = await asyncpg.connect(args.dsn or load_config().db.dsn)
+    try:
+        order_records = await connection.fetch(ORDER_ROWS, args.rows)
+        user_records = await connection.fetch(USER_ROWS, args.rows)
+    finally:
+        await connection.close()
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'model':<14}{'µs/row':>10}{'bytes/row':>12}")
+    for legacy, current, records in (
+        (LegacyOrder, Order, order_records),
+        (LegacyUser, User, user_records)
+    ):
+        for model in (legacy, current):
+            per_row, size = measure(model, records, args.repeat)
+            print(f"{model.__name__:<14}{per_row:>10.2f}{size:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+"""Benchmark: replay updates through the real dispatcher without network.
+
+Builds the bot exactly as main.py does (all routers, middlewares, Postgres
+FSM storage, repositories) against the database from .env, but with a fake
+Telegram session that records API calls instead of sending them. Replays
+a synthetic stream (each user goes /start → payment → service → amount →
+method → confirm → profile → orders; admins open stats) or recorded raw
+updates, and reports throughput and latency per handler.
+
+Users are replayed concurrently, the updates of one user in order (as
+Telegram delivers them). Synthetic users get ids from BENCHMARK_USER_ID
+up and are deleted before and after the run, so use a dev database.
+
+Usage:
+    python -m benchmarks.replay [--users 200] [--admins 2] [--api-latency 0]
+    python -m benchmarks.replay --updates updates.jsonl
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, get_args
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message
+
+from bot.app import bot_app, create_bot
+from bot.config import load_config
+from bot.database.db import Database
+from bot.models.order import PaymentMethod
+from bot.utils.sharding import update_user_id
+
+# Synthetic users are BENCHMARK_USER_ID + n, admins count down from it
+BENCHMARK_USER_ID = 7_000_000_000
+# Any well-formed token; nothing reaches Telegram
+BENCHMARK_TOKEN = "123456:benchmark"
+
+PAYMENT_METHODS = [
+    PaymentMethod.USDT_TRC20,
+    PaymentMethod.USDT_BEP20,
+    PaymentMethod.BYBIT_UID,
+    PaymentMethod.CARD,
+    PaymentMethod.LOLZ
+]
+
+
+class FakeSession(BaseSession):
+    """Session answering API calls locally and counting them."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: collections.Counter = collections.Counter()
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = method.__returning__
+        if returning is bool or bool in get_args(returning):
+            return True
+        if returning is Message:
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=getattr(method, "text", None)
+            )
+        raise NotImplementedError(f"{type(method).__name__} is not faked")
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError("Downloads are not faked")
+
+    async def close(self):
+        pass
+
+
+class HandlerTimer(BaseMiddleware):
+    """Inner middleware recording time spent in each handler (and the middlewares under it)."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = collections.defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.timings[name].append(time.perf_counter() - started)
+
+
+class Stream:
+    """Builder of raw Bot API updates."""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _sender(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"Bench {user_id}", "language_code": "ru"}
+
+    def _message(self, user_id: int, text: str) -> Dict[str, Any]:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._sender(user_id),
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    def message(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {"update_id": next(self._update_ids), "message": self._message(user_id, text)}
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._sender(user_id),
+                "chat_instance": str(user_id),
+                "message": self._message(user_id, "menu"),
+                "data": data
+            }
+        }
+
+
+def synthetic_stream(users: int, admins: int) -> Dict[int, List[Dict[str, Any]]]:
+    """Updates per user: payment flow for users, statistics for admins."""
+    stream = Stream()
+    updates = {}
+    for n in range(users):
+        user_id = BENCHMARK_USER_ID + n
+        updates[user_id] = [
+            stream.message(user_id, "/start"),
+            stream.callback(user_id, "payment_start"),
+            stream.message(user_id, f"Service {n}"),
+            stream.message(user_id, f"{10 + n % 490}.50"),
+            stream.callback(user_id, f"payment_method:{PAYMENT_METHODS[n % len(PAYMENT_METHODS)]}"),
+            stream.callback(user_id, "confirm_payment"),
+            stream.callback(user_id, "profile"),
+            stream.callback(user_id, "my_orders")
+        ]
+    for n in range(1, admins + 1):
+        admin_id = BENCHMARK_USER_ID - n
+        updates[admin_id] = [
+            stream.message(admin_id, "/admin"),
+            stream.callback(admin_id, "admin_stats"),
+            stream.callback(admin_id, "stats_period:day"),
+            stream.callback(admin_id, "stats_period:week"),
+            stream.callback(admin_id, "stats_period:month"),
+            stream.callback(admin_id, "admin_orders")
+        ]
+    return updates
+
+
+def recorded_stream(path: str) -> Dict[int, List[Dict[str, Any]]]:
+    """Raw updates (one JSON object per line) grouped per user, in file order."""
+    updates = collections.defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                update = json.loads(line)
+                updates[update_user_id(update)].append(update)
+    return updates
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def report(title: str, timings: Dict[str, List[float]]):
+    """Print count and p50/p95/p99 (ms) per name."""
+    print(f"{title:<28}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, values in sorted(timings.items(), key=lambda item: -len(item[1])):
+        values = sorted(values)
+        print(
+            f"{name:<28}{len(values):>7}"
+            + "".join(f"{percentile(values, q) * 1000:>9.2f}" for q in (50, 95, 99))
+        )
+
+
+async def cleanup(config, user_ids: Iterable[int]):
+    """Delete synthetic users; their orders go with them (ON DELETE CASCADE)."""
+    db = Database.from_config(config.db)
+    await db.connect()
+    try:
+        await db.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", list(user_ids))
+    finally:
+        await db.disconnect()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="synthetic users (payment flow)")
+    parser.add_argument("--admins", type=int, default=2, help="synthetic admins (statistics)")
+    parser.add_argument("--updates", help="replay raw updates from JSON lines file instead")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API latency, ms")
+    args = parser.parse_args()
+
+    if args.updates:
+        updates = recorded_stream(args.updates)
+        admin_ids = load_config().bot.admin_ids
+    else:
+        updates = synthetic_stream(args.users, args.admins)
+        admin_ids = [BENCHMARK_USER_ID - n for n in range(1, args.admins + 1)]
+
+    config = load_config()
+    config = replace(
+        config,
+        bot=replace(
+            config.bot,
+            token=BENCHMARK_TOKEN,
+            admin_ids=admin_ids,
+            admin_chat_id=BENCHMARK_USER_ID,
+            # Measure handlers, not the admin chat rate limit
+            admin_notify_rate=1e6
+        )
+    )
+    if not args.updates:
+        await cleanup(config, updates)
+
+    session = FakeSession(latency=args.api_latency / 1000)
+    timer = HandlerTimer()
+    update_timings: List[float] = []
+
+    async def replay_user(user_updates: List[Dict[str, Any]]):
+        for update in user_updates:
+            started = time.perf_counter()
+            await dp.feed_raw_update(bot, update)
+            update_timings.append(time.perf_counter() - started)
+
+    bot = create_bot(config, session=session)
+    async with bot_app(config, bot) as dp:
+        dp.message.middleware(timer)
+        dp.callback_query.middleware(timer)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(replay_user(user_updates) for user_updates in updates.values()))
+        elapsed = time.perf_counter() - started
+
+    if not args.updates:
+        await cleanup(config, updates)
+
+    total = len(update_timings)
+    print(f"{total} updates from {len(updates)} users in {elapsed:.2f}s: {total / elapsed:.0f} updates/s")
+    print()
+    report("handler", timer.timings)
+    print()
+    report("update (end to end)", {"all": update_timings})
+    print()
+    print("API calls: " + ", ".join(f"{name} {count}" for name, count in session.calls.most_common()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,303 @@
+"""Application wiring shared by single-process and worker modes."""
+import asyncio
+import logging
+import signal
+from contextlib import asynccontextmanager, suppress
+from dataclasses import replace
+from typing import AsyncIterator, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.config import Config, FxConfig, MetricsConfig, WebhookConfig
+from bot.database.db import Database
+from bot.database.fsm_storage import PostgresStorage
+from bot.models.user import UserRepository
+from bot.models.order import OrderRepository
+from bot.models.settings import SettingsRepository
+from bot.models.broadcast import BroadcastRepository
+from bot.services.broadcast import BroadcastEngine
+from bot.services.fx import FileRateSource, HttpRateSource, RateProvider, SettingsRateSource
+from bot.services.notifier import AdminNotifier
+from bot.middlewares.user_check import UserCheckMiddleware
+from bot.middlewares.metrics import ApiTimingMiddleware, HandlerLabelMiddleware, MetricsMiddleware
+from bot.filters.admin import AdminFilter
+from bot.utils.cache import TTLCache
+from bot.utils.metrics import Metrics
+from bot.utils.startup import StartupTimer
+from bot.keyboards import inline as keyboards
+
+# Import handlers
+from bot.handlers import common, payment, profile, admin
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+
+def create_bot(config: Config, session: Optional[BaseSession] = None) -> Bot:
+    """Create bot instance."""
+    return Bot(
+        token=config.bot.token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+
+def include_routers(dp: Dispatcher):
+    """Register handler routers."""
+    dp.include_router(common.router)
+    dp.include_router(payment.router)
+    dp.include_router(profile.router)
+    dp.include_router(admin.router)
+
+
+def listener_connections(config: Config) -> int:
+    """Count dedicated LISTEN connections a process opens besides its pool."""
+    # Settings snapshot and user cache invalidation, plus FSM cache
+    # invalidation with the postgres storage
+    return 2 + (config.bot.fsm_storage != "memory")
+
+
+def scale_config(config: Config, workers: int) -> Config:
+    """Give one of ``workers`` processes its share of pool size and notification rate.
+
+    DB_POOL_MAX_SIZE and ADMIN_NOTIFY_RATE are budgets for the whole
+    instance; a worker's LISTEN connections are taken out of its pool
+    share. BROADCAST_RATE is not split: each broadcast is delivered by the
+    one worker that created or claimed it.
+    """
+    if workers <= 1:
+        return config
+    pool_max_size = max(1, config.db.pool_max_size // workers - listener_connections(config))
+    return replace(
+        config,
+        db=replace(
+            config.db,
+            pool_max_size=pool_max_size,
+            pool_min_size=min(config.db.pool_min_size, pool_max_size)
+        ),
+        bot=replace(
+            config.bot,
+            admin_notify_rate=config.bot.admin_notify_rate / workers
+        )
+    )
+
+
+def create_rate_source(config: FxConfig, settings_repo: SettingsRepository):
+    """Create exchange rate source (None = keep the configured rate)."""
+    if config.source == "settings":
+        return SettingsRateSource(settings_repo)
+    if config.source == "file":
+        return FileRateSource(config.path, field=config.field)
+    if config.source == "http":
+        return HttpRateSource(config.url, field=config.field)
+    return None
+
+
+@asynccontextmanager
+async def bot_app(
+    config: Config,
+    bot: Bot,
+    timer: Optional[StartupTimer] = None
+) -> AsyncIterator[Dispatcher]:
+    """Connect database, start background services and yield ready dispatcher.
+
+    Everything the first updates need (pool connections, prepared
+    statements, settings, keyboards) is warmed up before yielding; the
+    phases are logged through ``timer``.
+    """
+    if timer is None:
+        timer = StartupTimer()
+
+    # Initialize database
+    db = Database.from_config(config.db)
+    await db.connect()
+    timer.mark("database")
+    if config.db.pool_stats_interval:
+        pool_stats_task = asyncio.create_task(db.log_pool_stats(config.db.pool_stats_interval))
+    else:
+        pool_stats_task = None
+
+    # FSM storage shared by all instances, falls back to aiogram's in-memory one
+    if config.bot.fsm_storage == "memory":
+        storage = MemoryStorage()
+    else:
+        storage = PostgresStorage(
+            db,
+            cache=TTLCache(maxsize=config.bot.fsm_cache_size, ttl=config.bot.fsm_cache_ttl),
+            ttl=config.bot.fsm_ttl
+        )
+        await storage.start()
+    dp = Dispatcher(storage=storage)
+
+    # Initialize repositories
+    user_repo = UserRepository(
+        db,
+        cache=TTLCache(maxsize=config.bot.user_cache_size, ttl=config.bot.user_cache_ttl),
+        flush_interval=config.bot.user_flush_interval
+    )
+    await user_repo.start_listener()
+    user_repo.start_flusher()
+    order_repo = OrderRepository(db)
+    settings_repo = SettingsRepository(db)
+    # Subscribe before loading so no change slips in between
+    await settings_repo.start_listener()
+    await settings_repo.load()
+    timer.mark("settings")
+
+    # Exchange rate, refreshed in the background
+    fx_rates = RateProvider(
+        config.bot.usd_to_rub_rate,
+        source=create_rate_source(config.fx, settings_repo),
+        interval=config.fx.refresh_interval,
+        max_age=config.fx.max_age
+    )
+    await fx_rates.start()
+    timer.mark("fx")
+
+    # Initialize broadcast engine and resume broadcasts interrupted by restart
+    broadcast_engine = BroadcastEngine(
+        bot,
+        BroadcastRepository(db),
+        rate=config.bot.broadcast_rate,
+        concurrency=config.bot.broadcast_concurrency
+    )
+    await broadcast_engine.resume()
+    timer.mark("broadcasts")
+
+    # Initialize admin chat notifier
+    admin_notifier = AdminNotifier(bot, config.bot.admin_chat_id, rate=config.bot.admin_notify_rate)
+    admin_notifier.start()
+
+    # Open min_size connections with hot statements prepared and build
+    # static keyboards before the first update arrives
+    await db.prewarm()
+    keyboards.prewarm()
+    timer.mark("prewarm")
+
+    # Initialize admin filter
+    admin_filter = AdminFilter(config.bot.admin_ids)
+
+    # Register middlewares
+    common.router.message.middleware(UserCheckMiddleware(user_repo))
+    common.router.callback_query.middleware(UserCheckMiddleware(user_repo))
+    payment.router.message.middleware(UserCheckMiddleware(user_repo))
+    payment.router.callback_query.middleware(UserCheckMiddleware(user_repo))
+    profile.router.callback_query.middleware(UserCheckMiddleware(user_repo))
+    admin.router.message.middleware(UserCheckMiddleware(user_repo))
+    admin.router.callback_query.middleware(UserCheckMiddleware(user_repo))
+
+    # Register routers
+    include_routers(dp)
+
+    # Time updates (including FSM state loading, so before the FSM middleware),
+    # handlers, database and Bot API calls
+    metrics = Metrics()
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(MetricsMiddleware(metrics))
+    dp.update.outer_middleware(dp.fsm)
+    dp.message.middleware(HandlerLabelMiddleware())
+    dp.callback_query.middleware(HandlerLabelMiddleware())
+    bot.session.middleware(ApiTimingMiddleware())
+    metrics_runner = (
+        await serve_metrics(metrics, db, fx_rates, user_repo, config.metrics) if config.metrics.port else None
+    )
+
+    # Set data to all handlers
+    dp.workflow_data.update({
+        "config": config,
+        "db": db,
+        "user_repo": user_repo,
+        "order_repo": order_repo,
+        "settings_repo": settings_repo,
+        "broadcast_engine": broadcast_engine,
+        "admin_notifier": admin_notifier,
+        "fx_rates": fx_rates,
+        "admin_filter": admin_filter,
+        "metrics": metrics
+    })
+    timer.mark("dispatcher")
+    timer.log()
+
+    try:
+        yield dp
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await admin_notifier.close()
+        await broadcast_engine.close()
+        await fx_rates.close()
+        await user_repo.close()
+        await settings_repo.close()
+        await storage.close()
+        if pool_stats_task:
+            pool_stats_task.cancel()
+        await db.disconnect()
+        await bot.session.close()
+
+
+async def serve_metrics(
+    metrics: Metrics,
+    db: Database,
+    fx_rates: RateProvider,
+    user_repo: UserRepository,
+    config: MetricsConfig
+) -> web.AppRunner:
+    """Serve metrics in Prometheus text format; caller cleans up the runner."""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(db, fx_rates, user_repo), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get(config.path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    logger.info(f"Metrics served on {config.host}:{config.port}{config.path}")
+    return runner
+
+
+def stop_event() -> asyncio.Event:
+    """Event set on SIGINT/SIGTERM."""
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stopped.set)
+    return stopped
+
+
+async def serve_webhook(
+    bot: Bot,
+    app: web.Application,
+    config: WebhookConfig,
+    secret: str,
+    allowed_updates: List[str]
+):
+    """Serve app, register the webhook and run until SIGINT/SIGTERM."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    stopped = stop_event()
+
+    try:
+        await web.TCPSite(runner, config.host, config.port).start()
+        await bot.set_webhook(
+            config.webhook_url,
+            secret_token=secret,
+            max_connections=config.max_connections,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=config.drop_pending_updates
+        )
+        logger.info(f"Webhook server listening on {config.host}:{config.port}{config.path}")
+        await stopped.wait()
+    finally:
+        if config.delete_on_shutdown:
+            try:
+                await bot.delete_webhook()
+            except Exception as e:
+                logger.error(f"Failed to delete webhook: {e}")
+        await runner.cleanup()
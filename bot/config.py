@@ -1,7 +1,8 @@
 """Configuration module for the payment bot."""
 import os
 from dataclasses import dataclass
-from typing import List
+from decimal import Decimal
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +16,15 @@ class DatabaseConfig:
     name: str
     user: str
     password: str
+    # Disable for PgBouncer in transaction pooling mode
+    prepared_statements: bool = True
+    pool_min_size: int = 5
+    pool_max_size: int = 20
+    command_timeout: float = 60.0
+    acquire_timeout: Optional[float] = None
+    max_inactive_connection_lifetime: float = 300.0
+    max_queries: int = 50000
+    pool_stats_interval: float = 0.0
 
     @property
     def dsn(self) -> str:
@@ -28,7 +38,68 @@ class BotConfig:
     token: str
     admin_ids: List[int]
     admin_chat_id: int
-    usd_to_rub_rate: float
+    # Used until (and whenever) the FX source can't provide a rate
+    usd_to_rub_rate: Decimal
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 300.0
+    user_flush_interval: float = 0.5
+    broadcast_rate: float = 25.0
+    broadcast_concurrency: int = 10
+    admin_notify_rate: float = 0.3
+    # "postgres" (shared, survives restarts) or "memory"
+    fsm_storage: str = "postgres"
+    fsm_cache_size: int = 10000
+    fsm_cache_ttl: float = 60.0
+    fsm_ttl: float = 86400.0
+    # "polling" or "webhook"
+    mode: str = "polling"
+    # Worker processes (>1 runs a supervisor routing updates by user id)
+    workers: int = 1
+
+
+@dataclass
+class WebhookConfig:
+    """Webhook server configuration (used when bot mode is "webhook")."""
+    # Public base URL Telegram sends updates to, e.g. https://bot.example.com
+    url: str = ""
+    path: str = "/webhook"
+    # Required in webhook mode, shared by all replicas
+    secret: str = ""
+    # Address of the embedded server; keep it local behind a reverse proxy
+    host: str = "127.0.0.1"
+    port: int = 8080
+    max_connections: int = 40
+    drop_pending_updates: bool = False
+    # Disable when several replicas share one webhook
+    delete_on_shutdown: bool = True
+
+    @property
+    def webhook_url(self) -> str:
+        """Get full webhook URL."""
+        return self.url.rstrip("/") + self.path
+
+
+@dataclass
+class MetricsConfig:
+    """Prometheus metrics endpoint configuration."""
+    host: str = "127.0.0.1"
+    # 0 = disabled; with several workers, worker N listens on port + N
+    port: int = 0
+    path: str = "/metrics"
+
+
+@dataclass
+class FxConfig:
+    """Exchange rate source configuration."""
+    # "env" (USD_TO_RUB_RATE only), "settings", "file" or "http"
+    source: str = "env"
+    path: str = "fx_rate.json"
+    url: str = ""
+    # Dotted path of the rate in the file/HTTP JSON
+    field: str = "usd_to_rub"
+    refresh_interval: float = 300.0
+    # Seconds after which a rate the source failed to refresh counts as stale (0 = never)
+    max_age: float = 3600.0
 
 
 @dataclass
@@ -36,22 +107,77 @@ class Config:
     """Main configuration class."""
     bot: BotConfig
     db: DatabaseConfig
+    webhook: WebhookConfig
+    metrics: MetricsConfig
+    fx: FxConfig
 
 
 def load_config() -> Config:
-    """Load configuration from environment variables."""
-    return Config(
+    """Load configuration from environment variables.
+
+    Raises ValueError for settings the configured mode cannot run without.
+    """
+    config = Config(
         bot=BotConfig(
             token=os.getenv("BOT_TOKEN"),
             admin_ids=[int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x],
             admin_chat_id=int(os.getenv("ADMIN_CHAT_ID", "0")),
-            usd_to_rub_rate=float(os.getenv("USD_TO_RUB_RATE", "95.50"))
+            usd_to_rub_rate=Decimal(os.getenv("USD_TO_RUB_RATE", "95.50")),
+            user_cache_size=int(os.getenv("USER_CACHE_SIZE", "10000")),
+            user_cache_ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+            user_flush_interval=int(os.getenv("USER_FLUSH_INTERVAL_MS", "500")) / 1000,
+            broadcast_rate=float(os.getenv("BROADCAST_RATE", "25")),
+            broadcast_concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "10")),
+            admin_notify_rate=float(os.getenv("ADMIN_NOTIFY_RATE", "0.3")),
+            fsm_storage=os.getenv("FSM_STORAGE", "postgres").lower(),
+            fsm_cache_size=int(os.getenv("FSM_CACHE_SIZE", "10000")),
+            fsm_cache_ttl=float(os.getenv("FSM_CACHE_TTL", "60")),
+            fsm_ttl=float(os.getenv("FSM_TTL", "86400")),
+            mode=os.getenv("BOT_MODE", "polling").lower(),
+            workers=int(os.getenv("BOT_WORKERS", "1")) or os.cpu_count() or 1
         ),
         db=DatabaseConfig(
             host=os.getenv("DB_HOST", "localhost"),
             port=int(os.getenv("DB_PORT", "5432")),
             name=os.getenv("DB_NAME", "payment_bot"),
             user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", "")
+            password=os.getenv("DB_PASSWORD", ""),
+            prepared_statements=os.getenv("DB_PREPARED_STATEMENTS", "1").lower() in ("1", "true", "yes"),
+            pool_min_size=int(os.getenv("DB_POOL_MIN_SIZE", "5")),
+            pool_max_size=int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+            command_timeout=float(os.getenv("DB_COMMAND_TIMEOUT", "60")),
+            acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT")) if os.getenv("DB_ACQUIRE_TIMEOUT") else None,
+            max_inactive_connection_lifetime=float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300")),
+            max_queries=int(os.getenv("DB_MAX_QUERIES", "50000")),
+            pool_stats_interval=float(os.getenv("DB_POOL_STATS_INTERVAL", "0"))
+        ),
+        webhook=WebhookConfig(
+            url=os.getenv("WEBHOOK_URL", ""),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            secret=os.getenv("WEBHOOK_SECRET", ""),
+            host=os.getenv("WEBHOOK_HOST", "127.0.0.1"),
+            port=int(os.getenv("WEBHOOK_PORT", "8080")),
+            max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+            drop_pending_updates=os.getenv("WEBHOOK_DROP_PENDING_UPDATES", "0").lower() in ("1", "true", "yes"),
+            delete_on_shutdown=os.getenv("WEBHOOK_DELETE_ON_SHUTDOWN", "1").lower() in ("1", "true", "yes")
+        ),
+        metrics=MetricsConfig(
+            host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            port=int(os.getenv("METRICS_PORT", "0")),
+            path=os.getenv("METRICS_PATH", "/metrics")
+        ),
+        fx=FxConfig(
+            source=os.getenv("FX_SOURCE", "env").lower(),
+            path=os.getenv("FX_FILE", "fx_rate.json"),
+            url=os.getenv("FX_URL", ""),
+            field=os.getenv("FX_FIELD", "usd_to_rub"),
+            refresh_interval=float(os.getenv("FX_REFRESH_INTERVAL", "300")),
+            max_age=float(os.getenv("FX_MAX_AGE", "3600"))
         )
     )
+
+    # Every replica and restart must register and check the same secret,
+    # a per-process random one would make the others reject Telegram's requests
+    if config.bot.mode == "webhook" and not config.webhook.secret:
+        raise ValueError("WEBHOOK_SECRET is required when BOT_MODE=webhook")
+    return config
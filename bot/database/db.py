@@ -1,31 +1,131 @@
 """Database connection and query execution."""
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
 import asyncpg
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Set, AsyncIterator, Iterable
 import logging
 
+from bot.database.metrics import PoolMetrics
+from bot.database.migrator import load_migrations, migrate
+from bot.utils.metrics import add_db_time
+
 logger = logging.getLogger(__name__)
 
 
+class BotConnection(asyncpg.Connection):
+    """Pool connection that tracks which registered statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: Set[str] = set()
+
+    async def prepare_cached(self, name: str, query: str):
+        """Prepare query into the connection's statement cache.
+
+        This is the same lookup Connection.fetch() and friends do before
+        executing, so later calls with this query text skip the Parse step.
+        Unlike Connection.prepare() the result survives the connection being
+        released back to the pool.
+        """
+        await self._get_statement(query, None)
+        self.prepared.add(name)
+
+
 class Database:
-    """Database connection manager."""
+    """Database connection manager.
+
+    Besides raw queries, repositories can declare named statements once with
+    register(); they are prepared on every pool connection when it is
+    acquired for the first time and executed by name with the *_named
+    methods. Statements registered as lazy (admin and background paths)
+    are left to asyncpg's statement cache, which prepares them on first
+    use.
 
-    def __init__(self, dsn: str):
+    With prepared_statements=False (PgBouncer in transaction mode) nothing
+    is prepared and asyncpg's statement cache is disabled, so every query
+    goes through the unnamed statement.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        prepared_statements: bool = True,
+        min_size: int = 5,
+        max_size: int = 20,
+        command_timeout: float = 60,
+        acquire_timeout: Optional[float] = None,
+        max_inactive_connection_lifetime: float = 300.0,
+        max_queries: int = 50000
+    ):
         self.dsn = dsn
         self.pool: Optional[asyncpg.Pool] = None
+        self.prepared_statements = prepared_statements
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
+        self.max_queries = max_queries
+        self.metrics = PoolMetrics()
+        self.statements: Dict[str, str] = {}
+        # Names of statements prepared up front on every connection
+        self.eager: Set[str] = set()
+        self._schema_ready = False
+
+    @classmethod
+    def from_config(cls, config) -> "Database":
+        """Create database manager from DatabaseConfig."""
+        return cls(
+            config.dsn,
+            prepared_statements=config.prepared_statements,
+            min_size=config.pool_min_size,
+            max_size=config.pool_max_size,
+            command_timeout=config.command_timeout,
+            acquire_timeout=config.acquire_timeout,
+            max_inactive_connection_lifetime=config.max_inactive_connection_lifetime,
+            max_queries=config.max_queries
+        )
+
+    def register(self, name: str, query: str, lazy: bool = False):
+        """Register named statement (lazy ones are not prepared up front)."""
+        if self.statements.get(name, query) != query:
+            raise ValueError(f"Statement '{name}' is already registered with another query")
+        self.statements[name] = query
+        if not lazy:
+            self.eager.add(name)
+
+    def register_many(self, statements: Dict[str, str], lazy: Iterable[str] = ()):
+        """Register several named statements, ``lazy`` naming those not prepared up front."""
+        lazy = set(lazy)
+        for name, query in statements.items():
+            self.register(name, query, lazy=name in lazy)
 
     async def connect(self):
         """Create database connection pool."""
         try:
+            if self.prepared_statements:
+                pool_options = {
+                    "connection_class": BotConnection,
+                    "setup": self._setup_connection
+                }
+            else:
+                pool_options = {"statement_cache_size": 0}
+
             self.pool = await asyncpg.create_pool(
                 self.dsn,
-                min_size=5,
-                max_size=20,
-                command_timeout=60
+                min_size=self.min_size,
+                max_size=self.max_size,
+                command_timeout=self.command_timeout,
+                max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                max_queries=self.max_queries,
+                **pool_options
             )
-            logger.info("Database connection pool created")
+            logger.info(f"Database connection pool created (min={self.min_size}, max={self.max_size})")
 
             # Initialize database schema
             await self.init_schema()
+            self._schema_ready = True
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
@@ -36,36 +136,152 @@ class Database:
             await self.pool.close()
             logger.info("Database connection pool closed")
 
-    async def init_schema(self):
-        """Initialize database schema."""
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquire pool connection, recording wait time, pool usage and time spent."""
+        metrics = self.metrics
+        metrics.start_waiting()
+        started = time.perf_counter()
         try:
-            with open("bot/database/schema.sql", "r", encoding="utf-8") as f:
-                schema = f.read()
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            metrics.acquire_timeouts += 1
+            raise
+        finally:
+            metrics.stop_waiting()
 
-            async with self.pool.acquire() as conn:
-                await conn.execute(schema)
+        metrics.acquired(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            metrics.released()
+            await self.pool.release(conn)
+            # Wait and query time count towards the update being handled
+            add_db_time(time.perf_counter() - started)
+
+    async def prewarm(self):
+        """Acquire ``min_size`` connections at once so each prepares the eager statements.
 
-            logger.info("Database schema initialized")
+        Call after the repositories have registered their statements, so the
+        first updates do not pay for Parse round trips.
+        """
+        if not self.pool:
+            return
+        async with AsyncExitStack() as stack:
+            await asyncio.gather(*(
+                stack.enter_async_context(self.acquire()) for _ in range(self.min_size)
+            ))
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Get pool size and saturation counters."""
+        stats = self.metrics.snapshot()
+        if self.pool:
+            stats.update(
+                size=self.pool.get_size(),
+                idle=self.pool.get_idle_size(),
+                min_size=self.pool.get_min_size(),
+                max_size=self.pool.get_max_size()
+            )
+        return stats
+
+    async def log_pool_stats(self, interval: float):
+        """Periodically log pool stats (run as background task)."""
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Database pool stats: {self.pool_stats()}")
+
+    async def listen(
+        self,
+        channel: str,
+        callback: Callable,
+        on_terminate: Optional[Callable] = None
+    ) -> asyncpg.Connection:
+        """Open a dedicated connection subscribed to NOTIFY channel.
+
+        The connection lives outside the pool, so it does not hold a pool slot
+        and survives pool resets. Caller is responsible for closing it.
+        """
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(channel, callback)
+        if on_terminate:
+            conn.add_termination_listener(on_terminate)
+        logger.info(f"Listening for notifications on '{channel}'")
+        return conn
+
+    async def init_schema(self):
+        """Apply pending schema migrations (only checks the version when up to date)."""
+        try:
+            async with self.acquire() as conn:
+                applied = await migrate(conn, load_migrations())
+
+            if applied:
+                logger.info(f"Database schema migrated ({applied} migrations applied)")
+            else:
+                logger.info("Database schema is up to date")
         except Exception as e:
             logger.error(f"Failed to initialize schema: {e}")
             raise
 
+    async def _setup_connection(self, conn):
+        """Prepare eager statements missing on the acquired connection."""
+        if self._schema_ready and len(conn.prepared) < len(self.eager):
+            for name in self.eager - conn.prepared:
+                await conn.prepare_cached(name, self.statements[name])
+
+    async def _run_named(self, method: str, name: str, args) -> Any:
+        """Run named statement with given connection method."""
+        query = self.statements[name]
+        async with self.acquire() as conn:
+            return await getattr(conn, method)(query, *args)
+
+    async def execute_named(self, name: str, *args) -> str:
+        """Execute named statement without returning results."""
+        return await self._run_named("execute", name, args)
+
+    async def fetch_named(self, name: str, *args) -> List[asyncpg.Record]:
+        """Fetch multiple rows with named statement."""
+        return await self._run_named("fetch", name, args)
+
+    async def fetchrow_named(self, name: str, *args) -> Optional[asyncpg.Record]:
+        """Fetch a single row with named statement."""
+        return await self._run_named("fetchrow", name, args)
+
+    async def fetchval_named(self, name: str, *args) -> Any:
+        """Fetch a single value with named statement."""
+        return await self._run_named("fetchval", name, args)
+
+    async def iterate(self, query: str, *args, prefetch: int = 1000) -> AsyncIterator[asyncpg.Record]:
+        """Stream rows through a server-side cursor in constant memory.
+
+        Rows are fetched ``prefetch`` at a time inside a read-only transaction
+        that holds one pool connection until iteration ends. Stop early only
+        via contextlib.aclosing() so the connection is released promptly.
+        """
+        async with self.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(query, *args, prefetch=prefetch):
+                    yield record
+
+    def iterate_named(self, name: str, *args, prefetch: int = 1000) -> AsyncIterator[asyncpg.Record]:
+        """Stream rows of named statement through a server-side cursor."""
+        return self.iterate(self.statements[name], *args, prefetch=prefetch)
+
     async def execute(self, query: str, *args) -> str:
         """Execute a query without returning results."""
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.execute(query, *args)
 
     async def fetch(self, query: str, *args) -> List[asyncpg.Record]:
         """Fetch multiple rows."""
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.fetch(query, *args)
 
     async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
         """Fetch a single row."""
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.fetchrow(query, *args)
 
     async def fetchval(self, query: str, *args) -> Any:
         """Fetch a single value."""
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             return await conn.fetchval(query, *args)
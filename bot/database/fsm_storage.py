@@ -0,0 +1,285 @@
+"""FSM storage backed by Postgres."""
+import asyncio
+import json
+import logging
+import secrets
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from bot.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel of FSM state changes; payload is "<instance> <storage key>"
+FSM_CHANNEL = "fsm_changed"
+
+# (state, data) of one FSM context
+Entry = Tuple[Optional[str], Dict[str, Any]]
+
+_EMPTY: Entry = (None, {})
+
+# JSON object standing for a Decimal, so amounts come back as Decimal
+_DECIMAL = "$decimal"
+
+
+def _encode(value: Any) -> Any:
+    """JSON-encode values json does not support (only Decimal)."""
+    if isinstance(value, Decimal):
+        return {_DECIMAL: str(value)}
+    raise TypeError(f"FSM data value of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    """Turn objects written by _encode back into values."""
+    if len(obj) == 1 and _DECIMAL in obj:
+        return Decimal(obj[_DECIMAL])
+    return obj
+
+
+def dump_data(data: Dict[str, Any]) -> str:
+    """Serialize FSM data."""
+    return json.dumps(data, default=_encode)
+
+
+def load_data(raw: str) -> Dict[str, Any]:
+    """Deserialize FSM data."""
+    return json.loads(raw, object_hook=_decode)
+
+
+class PostgresStorage(BaseStorage):
+    """aiogram FSM storage in the fsm_states table.
+
+    Writes go through to the database before set_state()/set_data()
+    return; writes arriving while one is in flight are sent together in
+    the next statement. Reads are served from an in-process cache
+    (including "no state", which is what most updates see). Every write
+    sends a NOTIFY, on which the other instances drop the key from their
+    caches; while the listener connection is down the cache is bypassed.
+    Flows not touched for ``ttl`` seconds are treated as abandoned and
+    purged.
+    """
+
+    STATEMENTS = {
+        "fsm.get": """
+            SELECT state, data FROM fsm_states
+            WHERE key = $1 AND updated_at > NOW() - make_interval(secs => $2)
+        """,
+        "fsm.save": """
+            WITH saved AS (
+                INSERT INTO fsm_states (key, state, data, updated_at)
+                SELECT key, state, data::jsonb, NOW()
+                FROM unnest($1::varchar[], $2::varchar[], $3::text[]) AS t(key, state, data)
+                ON CONFLICT (key) DO UPDATE
+                SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = NOW()
+            )
+            SELECT pg_notify($4, $5 || ' ' || key) FROM unnest($1::varchar[]) AS t(key)
+        """,
+        "fsm.delete": """
+            WITH deleted AS (
+                DELETE FROM fsm_states WHERE key = ANY($1::varchar[])
+            )
+            SELECT pg_notify($2, $3 || ' ' || key) FROM unnest($1::varchar[]) AS t(key)
+        """,
+        "fsm.purge": "DELETE FROM fsm_states WHERE updated_at < NOW() - make_interval(secs => $1)",
+    }
+
+    # Run every purge_interval by one connection, prepared on first use
+    LAZY_STATEMENTS = frozenset({"fsm.purge"})
+
+    def __init__(
+        self,
+        db,
+        cache: Optional[TTLCache] = None,
+        ttl: float = 86400.0,
+        purge_interval: float = 600.0,
+        key_builder: Optional[KeyBuilder] = None,
+        channel: str = FSM_CHANNEL,
+        reconnect_delay: float = 5.0
+    ):
+        self.db = db
+        db.register_many(self.STATEMENTS, lazy=self.LAZY_STATEMENTS)
+        self.cache = cache if cache is not None else TTLCache(ttl=60.0)
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        # Tells own notifications apart from other instances'
+        self.instance = secrets.token_hex(4)
+        # Bumped on every invalidation, so a read racing one is not cached
+        self._invalidations = 0
+        # Writes waiting for the next statement and the one in flight
+        self._pending: Dict[str, Entry] = {}
+        self._writing: Dict[str, Entry] = {}
+        self._pending_done: Optional[asyncio.Future] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self):
+        """Subscribe to changes made by other instances and start purging abandoned flows."""
+        await self._listen()
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def _listen(self):
+        """Open listener connection."""
+        self._listener = await self.db.listen(self.channel, self._on_notify, on_terminate=self._on_listener_lost)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Drop state changed by another instance from the cache."""
+        instance, _, storage_key = payload.partition(" ")
+        if instance != self.instance:
+            self._invalidations += 1
+            self.cache.pop(storage_key)
+
+    def _on_listener_lost(self, connection):
+        """Stop trusting the cache until the listener is back."""
+        self._listener = None
+        self._invalidations += 1
+        self.cache.clear()
+        if self._closed:
+            return
+        logger.warning("FSM listener connection lost, reading states from the database until reconnected")
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Re-subscribe; changes missed meanwhile are covered by clearing the cache."""
+        while not self._closed:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self._listen()
+            except Exception as e:
+                logger.error(f"Failed to reconnect FSM listener: {e}")
+                continue
+            self._invalidations += 1
+            self.cache.clear()
+            logger.info("FSM listener reconnected")
+            return
+
+    def _peek(self, storage_key: str) -> Optional[Entry]:
+        """Get entry being written or cached, without querying the database."""
+        entry = self._pending.get(storage_key)
+        if entry is None:
+            entry = self._writing.get(storage_key)
+        if entry is None and self._listener is not None:
+            entry = self.cache.get(storage_key)
+        return entry
+
+    async def _load(self, storage_key: str) -> Entry:
+        """Get (state, data) from cache or database."""
+        entry = self._peek(storage_key)
+        if entry is not None:
+            return entry
+
+        invalidations = self._invalidations
+        record = await self.db.fetchrow_named("fsm.get", storage_key, self.ttl)
+        # A write may have happened while we were waiting for the database
+        entry = self._peek(storage_key)
+        if entry is not None:
+            return entry
+
+        entry = (record["state"], load_data(record["data"])) if record else _EMPTY
+        # The record may predate a change another instance announced meanwhile
+        if self._listener is not None and invalidations == self._invalidations:
+            self.cache.set(storage_key, entry)
+        return entry
+
+    async def _store(self, storage_key: str, entry: Entry):
+        """Write entry through to the database, batched with concurrent writes."""
+        # Fail here, in the handler, rather than for the whole batch
+        dump_data(entry[1])
+        self._pending[storage_key] = entry
+        if self._pending_done is None:
+            self._pending_done = asyncio.get_running_loop().create_future()
+        done = self._pending_done
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_batches())
+        # The batch is written even if the handler gets cancelled meanwhile
+        await asyncio.shield(done)
+
+    async def _write_batches(self):
+        """Write queued entries, one statement per batch, until none are left."""
+        while self._pending:
+            self._writing, self._pending = self._pending, {}
+            done, self._pending_done = self._pending_done, None
+            try:
+                await self._write(self._writing)
+            except Exception as e:
+                done.set_exception(e)
+            else:
+                for storage_key, entry in self._writing.items():
+                    self.cache.set(storage_key, entry)
+                done.set_result(None)
+            finally:
+                self._writing = {}
+
+    async def _write(self, entries: Dict[str, Entry]):
+        """Save entries; cleared contexts are deleted."""
+        saved = {key: entry for key, entry in entries.items() if entry[0] is not None or entry[1]}
+        deleted: List[str] = [key for key in entries if key not in saved]
+        if saved:
+            await self.db.execute_named(
+                "fsm.save",
+                list(saved.keys()),
+                [state for state, _ in saved.values()],
+                [dump_data(data) for _, data in saved.values()],
+                self.channel,
+                self.instance
+            )
+        if deleted:
+            await self.db.execute_named("fsm.delete", deleted, self.channel, self.instance)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Set state for key."""
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        await self._store(storage_key, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Get state for key."""
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Replace data for key."""
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        await self._store(storage_key, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Get copy of data for key."""
+        _, data = await self._load(self.key_builder.build(key))
+        return data.copy()
+
+    async def purge(self) -> str:
+        """Delete flows abandoned for longer than ttl."""
+        return await self.db.execute_named("fsm.purge", self.ttl)
+
+    async def _purge_loop(self):
+        """Periodically purge abandoned flows."""
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge()
+            except Exception as e:
+                logger.error(f"Failed to purge FSM states: {e}")
+
+    async def close(self) -> None:
+        """Wait for writes in flight, stop purging and listening."""
+        self._closed = True
+        if self._writer:
+            await asyncio.gather(self._writer, return_exceptions=True)
+        for task in (self._purge_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        listener, self._listener = self._listener, None
+        if listener and not listener.is_closed():
+            listener.remove_termination_listener(self._on_listener_lost)
+            await listener.close()
@@ -0,0 +1,66 @@
+"""Connection pool instrumentation."""
+from typing import Any, Dict, List
+
+# Upper bounds (seconds) of acquire wait histogram buckets
+ACQUIRE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class PoolMetrics:
+    """Counters for pool saturation: acquire wait, in-use and waiting connections."""
+
+    def __init__(self, buckets: tuple = ACQUIRE_WAIT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts: List[int] = [0] * (len(buckets) + 1)
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        self.in_use = 0
+        self.in_use_max = 0
+        self.waiting = 0
+        self.waiting_max = 0
+
+    def start_waiting(self):
+        """Register caller waiting for a connection."""
+        self.waiting += 1
+        if self.waiting > self.waiting_max:
+            self.waiting_max = self.waiting
+
+    def stop_waiting(self):
+        """Unregister waiting caller (acquired or failed)."""
+        self.waiting -= 1
+
+    def acquired(self, wait: float):
+        """Register acquired connection and how long the caller waited for it."""
+        self.acquires += 1
+        self.acquire_wait_total += wait
+        if wait > self.acquire_wait_max:
+            self.acquire_wait_max = wait
+
+        for index, bound in enumerate(self.buckets):
+            if wait <= bound:
+                self.bucket_counts[index] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+        self.in_use += 1
+        if self.in_use > self.in_use_max:
+            self.in_use_max = self.in_use
+
+    def released(self):
+        """Register connection returned to the pool."""
+        self.in_use -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get current values."""
+        return {
+            "acquires": self.acquires,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_avg_ms": round(self.acquire_wait_total / self.acquires * 1000, 3) if self.acquires else 0.0,
+            "acquire_wait_max_ms": round(self.acquire_wait_max * 1000, 3),
+            "in_use": self.in_use,
+            "in_use_max": self.in_use_max,
+            "waiting": self.waiting,
+            "waiting_max": self.waiting_max
+        }
@@ -0,0 +1,295 @@
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    id BIGSERIAL PRIMARY KEY,
+    telegram_id BIGINT UNIQUE NOT NULL,
+    username VARCHAR(255),
+    first_name VARCHAR(255),
+    language VARCHAR(2) DEFAULT 'ru',
+    is_blocked BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Orders table
+DO $$ BEGIN
+    CREATE TYPE order_status AS ENUM (
+        'PENDING',           -- Ожидает оплаты
+        'PAID_USER',         -- Оплачен пользователем (требует проверки)
+        'COMPLETED',         -- Успешно выполнен
+        'REJECTED'           -- Отменен/Не успешен
+    );
+EXCEPTION
+    WHEN duplicate_object THEN null;
+END $$;
+
+DO $$ BEGIN
+    CREATE TYPE payment_method AS ENUM (
+        'USDT_TRC20',
+        'USDT_BEP20',
+        'BYBIT_UID',
+        'CARD',
+        'LOLZ'
+    );
+EXCEPTION
+    WHEN duplicate_object THEN null;
+END $$;
+
+CREATE TABLE IF NOT EXISTS orders (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(telegram_id) ON DELETE CASCADE,
+    service_name VARCHAR(500) NOT NULL,
+    base_amount DECIMAL(10, 2) NOT NULL,        -- Базовая сумма в USD
+    commission_rate DECIMAL(5, 2) NOT NULL,     -- Процент комиссии
+    commission_amount DECIMAL(10, 2) NOT NULL,  -- Сумма комиссии в USD
+    total_amount DECIMAL(10, 2) NOT NULL,       -- Итоговая сумма в USD
+    payment_method payment_method NOT NULL,
+    payment_amount DECIMAL(10, 2) NOT NULL,     -- Сумма к оплате (может быть в RUB или USD)
+    payment_currency VARCHAR(10) NOT NULL,      -- USD, RUB, USDT
+    status order_status DEFAULT 'PENDING',
+    created_at TIMESTAMP DEFAULT NOW(),
+    paid_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    exchange_rate DECIMAL(12, 4)                -- Курс USD→RUB, по которому посчитана сумма в RUB
+);
+
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS exchange_rate DECIMAL(12, 4);
+
+-- Settings table (for payment details and custom texts)
+CREATE TABLE IF NOT EXISTS settings (
+    key VARCHAR(255) PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Initialize default settings
+INSERT INTO settings (key, value) VALUES
+    ('usdt_trc20_address', ''),
+    ('usdt_bep20_address', ''),
+    ('bybit_uid', ''),
+    ('card_number', ''),
+    ('lolz_requisites', ''),
+    ('instruction_text_ru', 'Спасибо за оплату! Ваш заказ обрабатывается.'),
+    ('instruction_text_en', 'Thank you for payment! Your order is being processed.'),
+    ('info_channel_url', ''),
+    ('info_support_url', ''),
+    ('info_terms_url', ''),
+    ('info_refund_url', '')
+ON CONFLICT (key) DO NOTHING;
+
+-- Broadcasts with per-recipient delivery state (resumable after restart)
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id BIGSERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_by BIGINT NOT NULL,
+    language VARCHAR(2) DEFAULT 'ru',
+    progress_chat_id BIGINT,                    -- Сообщение админа с прогрессом
+    progress_message_id BIGINT,
+    status VARCHAR(16) NOT NULL DEFAULT 'RUNNING',  -- RUNNING, FINISHED
+    lease_until TIMESTAMP,                      -- Инстанс, рассылающий сейчас, продлевает аренду
+    created_at TIMESTAMP DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    broadcast_id BIGINT REFERENCES broadcasts(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'PENDING',  -- PENDING, SENT, FAILED
+    error TEXT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (broadcast_id, user_id)
+);
+
+-- FSM contexts (aiogram storage), shared by all bot instances
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key VARCHAR(255) PRIMARY KEY,
+    state VARCHAR(255),
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+
+-- Keyset pagination over (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_id ON orders(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_id ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created_id ON orders(created_at DESC, id DESC);
+
+-- At most one active (PENDING/PAID_USER) order per user; the index also
+-- serves the active order lookup. Duplicates left by the former
+-- read-then-insert race are resolved without losing a payment: unpaid
+-- (PENDING) orders are rejected when the user has a paid one or a newer
+-- unpaid one. Several paid (PAID_USER) orders of one user can only be
+-- resolved by an admin checking the payments, so they are listed and the
+-- migration stops (see the HINT for the repair statement).
+DO $$
+DECLARE
+    duplicates TEXT;
+    rejected INTEGER;
+BEGIN
+    IF to_regclass('idx_orders_one_active_per_user') IS NULL THEN
+        UPDATE orders SET status = 'REJECTED'
+        WHERE status = 'PENDING' AND EXISTS (
+            SELECT 1 FROM orders other
+            WHERE other.user_id = orders.user_id
+              AND (other.status = 'PAID_USER' OR (other.status = 'PENDING' AND other.id > orders.id))
+        );
+        GET DIAGNOSTICS rejected = ROW_COUNT;
+        IF rejected > 0 THEN
+            RAISE WARNING 'Rejected % duplicate unpaid active orders', rejected;
+        END IF;
+
+        SELECT string_agg(format('user %s: orders %s', user_id, ids), '; ')
+        INTO duplicates
+        FROM (
+            SELECT user_id, string_agg(format('#%s (%s)', id, status), ', ' ORDER BY id) AS ids
+            FROM orders
+            WHERE status IN ('PENDING', 'PAID_USER')
+            GROUP BY user_id
+            HAVING COUNT(*) > 1
+        ) active;
+
+        IF duplicates IS NOT NULL THEN
+            RAISE EXCEPTION 'Users with several active orders: %', duplicates
+                USING HINT = 'Check the payments, then for every order but one per user run '
+                    'UPDATE orders SET status = ''COMPLETED'', completed_at = NOW() WHERE id = <id> '
+                    '(or SET status = ''REJECTED'' if it was not paid) and restart the bot';
+        END IF;
+
+        CREATE UNIQUE INDEX idx_orders_one_active_per_user
+            ON orders(user_id) WHERE status IN ('PENDING', 'PAID_USER');
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_pending
+    ON broadcast_recipients(broadcast_id, user_id) WHERE status = 'PENDING';
+CREATE INDEX IF NOT EXISTS idx_broadcasts_running ON broadcasts(id) WHERE status = 'RUNNING';
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
+
+-- Function to update updated_at timestamp
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- Triggers for updated_at
+DROP TRIGGER IF EXISTS update_users_updated_at ON users;
+CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_orders_updated_at ON orders;
+CREATE TRIGGER update_orders_updated_at BEFORE UPDATE ON orders
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_settings_updated_at ON settings;
+CREATE TRIGGER update_settings_updated_at BEFORE UPDATE ON settings
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+
+-- Notify bot instances about settings changes (reloads in-memory snapshot)
+CREATE OR REPLACE FUNCTION notify_settings_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('settings_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS notify_settings_changed ON settings;
+CREATE TRIGGER notify_settings_changed AFTER INSERT OR UPDATE OR DELETE ON settings
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_settings_changed();
+
+-- Hourly order statistics rollup (maintained by trigger on orders)
+CREATE TABLE IF NOT EXISTS order_stats_hourly (
+    bucket TIMESTAMP PRIMARY KEY,               -- date_trunc('hour', orders.created_at)
+    total_orders BIGINT NOT NULL DEFAULT 0,
+    pending_orders BIGINT NOT NULL DEFAULT 0,
+    paid_user_orders BIGINT NOT NULL DEFAULT 0,
+    completed_orders BIGINT NOT NULL DEFAULT 0,
+    rejected_orders BIGINT NOT NULL DEFAULT 0,
+    turnover_usd DECIMAL(14, 2) NOT NULL DEFAULT 0,     -- SUM(total_amount)
+    commission_usd DECIMAL(14, 2) NOT NULL DEFAULT 0,   -- SUM(commission_amount)
+    turnover_rub DECIMAL(14, 2) NOT NULL DEFAULT 0      -- SUM(payment_amount) для RUB
+);
+
+-- Add (sign = 1) or remove (sign = -1) order contribution to its hourly bucket
+CREATE OR REPLACE FUNCTION apply_order_stats(o orders, sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF o.created_at IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO order_stats_hourly AS s (
+        bucket, total_orders, pending_orders, paid_user_orders, completed_orders,
+        rejected_orders, turnover_usd, commission_usd, turnover_rub
+    )
+    VALUES (
+        date_trunc('hour', o.created_at),
+        sign,
+        sign * (o.status = 'PENDING')::INTEGER,
+        sign * (o.status = 'PAID_USER')::INTEGER,
+        sign * (o.status = 'COMPLETED')::INTEGER,
+        sign * (o.status = 'REJECTED')::INTEGER,
+        sign * o.total_amount,
+        sign * o.commission_amount,
+        sign * CASE WHEN o.payment_currency = 'RUB' THEN o.payment_amount ELSE 0 END
+    )
+    ON CONFLICT (bucket) DO UPDATE SET
+        total_orders = s.total_orders + EXCLUDED.total_orders,
+        pending_orders = s.pending_orders + EXCLUDED.pending_orders,
+        paid_user_orders = s.paid_user_orders + EXCLUDED.paid_user_orders,
+        completed_orders = s.completed_orders + EXCLUDED.completed_orders,
+        rejected_orders = s.rejected_orders + EXCLUDED.rejected_orders,
+        turnover_usd = s.turnover_usd + EXCLUDED.turnover_usd,
+        commission_usd = s.commission_usd + EXCLUDED.commission_usd,
+        turnover_rub = s.turnover_rub + EXCLUDED.turnover_rub;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_order_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_order_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_order_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_order_stats ON orders;
+CREATE TRIGGER update_order_stats
+    AFTER INSERT OR DELETE OR UPDATE OF
+        status, created_at, total_amount, commission_amount, payment_amount, payment_currency
+    ON orders
+    FOR EACH ROW EXECUTE FUNCTION update_order_stats();
+
+-- Backfill rollup from existing orders once (orders are locked by CREATE TRIGGER above)
+INSERT INTO order_stats_hourly (
+    bucket, total_orders, pending_orders, paid_user_orders, completed_orders,
+    rejected_orders, turnover_usd, commission_usd, turnover_rub
+)
+SELECT
+    date_trunc('hour', created_at),
+    COUNT(*),
+    COUNT(*) FILTER (WHERE status = 'PENDING'),
+    COUNT(*) FILTER (WHERE status = 'PAID_USER'),
+    COUNT(*) FILTER (WHERE status = 'COMPLETED'),
+    COUNT(*) FILTER (WHERE status = 'REJECTED'),
+    COALESCE(SUM(total_amount), 0),
+    COALESCE(SUM(commission_amount), 0),
+    COALESCE(SUM(payment_amount) FILTER (WHERE payment_currency = 'RUB'), 0)
+FROM orders
+WHERE created_at IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM order_stats_hourly)
+GROUP BY 1;
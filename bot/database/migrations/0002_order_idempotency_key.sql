@@ -0,0 +1,5 @@
+-- Payment flow that created the order ("<user id>:<flow nonce>"), so a
+-- repeated payment method tap gets the same order instead of a new one.
+-- Orders created before this migration keep NULL (not unique-checked).
+-- The unique index is built concurrently by 0005_order_idempotency_key_index.
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
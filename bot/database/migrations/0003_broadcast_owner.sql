@@ -0,0 +1,4 @@
+-- Instance holding the broadcast lease: only it may renew or release the
+-- lease, so an instance that lost it (e.g. during an outage) stops instead
+-- of delivering alongside the one that took the broadcast over.
+ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS owner VARCHAR(32);
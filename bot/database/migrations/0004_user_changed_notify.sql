@@ -0,0 +1,23 @@
+-- Notify bot instances about language/block changes of a user (drops it from
+-- their user caches), including changes made directly in SQL.
+CREATE OR REPLACE FUNCTION notify_user_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('user_changed', OLD.telegram_id::text);
+    ELSE
+        PERFORM pg_notify('user_changed', NEW.telegram_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS notify_user_changed ON users;
+CREATE TRIGGER notify_user_changed AFTER UPDATE OF language, is_blocked ON users
+    FOR EACH ROW
+    WHEN (OLD.language IS DISTINCT FROM NEW.language OR OLD.is_blocked IS DISTINCT FROM NEW.is_blocked)
+    EXECUTE FUNCTION notify_user_changed();
+
+DROP TRIGGER IF EXISTS notify_user_deleted ON users;
+CREATE TRIGGER notify_user_deleted AFTER DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_changed();
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Built without blocking writes to orders, so instances still running
+-- during a rolling deploy keep creating orders meanwhile.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_idempotency_key ON orders(idempotency_key);
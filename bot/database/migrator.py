@@ -0,0 +1,149 @@
+"""Versioned schema migrations."""
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Numbered SQL files: 0001_initial.sql, 0002_<name>.sql, ...
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# First line of migrations that cannot run in a transaction, e.g. CREATE INDEX
+# CONCURRENTLY; such a file must hold a single statement
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+# Advisory lock key serializing migrations across processes
+MIGRATION_LOCK_ID = 7_201_930_001
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+"""
+
+
+class Migration(NamedTuple):
+    """One migration file."""
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        """SHA-256 of the file, to detect migrations edited after they were applied."""
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    @property
+    def transactional(self) -> bool:
+        """Whether the migration runs in a transaction (all but NO_TRANSACTION ones)."""
+        return not self.sql.startswith(NO_TRANSACTION)
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Read migrations ordered by version."""
+    migrations = []
+    for path in directory.iterdir():
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append(Migration(int(match[1]), match[2], path.read_text(encoding="utf-8")))
+    migrations.sort()
+
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+async def current_version(conn: asyncpg.Connection) -> int:
+    """Get latest applied version (0 for a database without migrations)."""
+    if await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+        return 0
+    return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+
+
+def _log_warning(conn: asyncpg.Connection, message: asyncpg.PostgresLogMessage):
+    """Log WARNING raised by a migration (NOTICEs like "already exists, skipping" are not)."""
+    if message.severity_en == "WARNING":
+        logger.warning(f"Migration: {message.message}")
+
+
+async def _record(conn: asyncpg.Connection, migration: Migration):
+    """Mark migration as applied."""
+    await conn.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+        migration.version, migration.name, migration.checksum
+    )
+
+
+async def _check_indexes(conn: asyncpg.Connection, migration: Migration):
+    """Fail if an interrupted concurrent index build left an invalid index.
+
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS skips such an index on the
+    next attempt instead of rebuilding it.
+    """
+    invalid = await conn.fetchval(
+        "SELECT string_agg(indexrelid::regclass::text, ', ') FROM pg_index WHERE NOT indisvalid"
+    )
+    if invalid:
+        raise RuntimeError(
+            f"Migration {migration.version:04d}_{migration.name} left invalid indexes: {invalid}; "
+            f"fix the cause (e.g. duplicate keys), DROP INDEX CONCURRENTLY them and restart"
+        )
+
+
+async def migrate(conn: asyncpg.Connection, migrations: List[Migration]) -> int:
+    """Apply pending migrations; returns how many were applied.
+
+    A database already at the latest version is only read: no locks, no
+    DDL. Otherwise the advisory lock makes concurrently starting
+    processes apply migrations one at a time (the others find them
+    applied once they get the lock). Each migration runs in its own
+    transaction together with its schema_migrations row, except
+    NO_TRANSACTION ones: those are recorded after they succeed, and must
+    not leave invalid indexes behind (a failed concurrent build does).
+    """
+    latest = migrations[-1].version if migrations else 0
+    if await current_version(conn) >= latest:
+        return 0
+
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    # Migrations report data they changed with RAISE WARNING
+    conn.add_log_listener(_log_warning)
+    try:
+        await conn.execute(CREATE_MIGRATIONS_TABLE)
+        applied: Dict[int, str] = {
+            record["version"]: record["checksum"]
+            for record in await conn.fetch("SELECT version, checksum FROM schema_migrations")
+        }
+
+        count = 0
+        for migration in migrations:
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    logger.warning(
+                        f"Migration {migration.version:04d}_{migration.name} changed after it was applied"
+                    )
+                continue
+
+            if migration.transactional:
+                async with conn.transaction():
+                    await conn.execute(migration.sql)
+                    await _record(conn, migration)
+            else:
+                await conn.execute(migration.sql)
+                await _check_indexes(conn, migration)
+                await _record(conn, migration)
+            logger.info(f"Applied migration {migration.version:04d}_{migration.name}")
+            count += 1
+        return count
+    finally:
+        conn.remove_log_listener(_log_warning)
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
@@ -1,15 +1,25 @@
 """Admin panel handlers."""
+import asyncio
+import csv
+import os
+import tempfile
+from contextlib import aclosing
 from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Sequence
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from bot.models.user import User, UserRepository
 from bot.models.order import OrderRepository, OrderStatus
+from bot.models.broadcast import Broadcast
+from bot.services.broadcast import BroadcastEngine
 from bot.filters.admin import AdminFilter
+from bot.utils.metrics import Metrics
 from bot.utils.texts import get_text
+from bot.utils.pagination import PREV, decode_cursor
 from bot.keyboards.inline import (
     get_admin_menu,
     get_stats_period_menu,
@@ -22,12 +32,30 @@ from bot.keyboards.inline import (
 
 router = Router()
 
+# Rows written to the export file at a time (one chunk buffered while the previous is written)
+EXPORT_CHUNK_SIZE = 5000
+
 
 class AdminStates(StatesGroup):
     """Admin states."""
     waiting_for_broadcast = State()
 
 
+def _order_admin_text(language: str, order) -> str:
+    """Render order card shown to admins."""
+    return get_text(
+        language,
+        "order_admin_details",
+        id=order.id,
+        user_id=order.user_id,
+        service=order.service_name,
+        total=float(order.total_amount),
+        method=get_text(language, f"method_{order.payment_method.lower()}"),
+        status=get_text(language, f"status_{order.status.lower()}"),
+        created_at=order.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
 @router.message(Command("admin"))
 async def cmd_admin(message: Message, user: User, admin_filter: AdminFilter):
     """Show admin panel."""
@@ -109,16 +137,20 @@ async def show_orders_filter(callback: CallbackQuery, user: User):
 
 @router.callback_query(F.data.startswith("admin_orders_filter:"))
 async def show_orders_list(callback: CallbackQuery, user: User, order_repo: OrderRepository):
-    """Show orders list with filter."""
-    filter_type = callback.data.split(":")[1]
+    """Show orders list with filter (admin_orders_filter:<filter>[:<direction>:<cursor>])."""
+    parts = callback.data.split(":")
+    filter_type = parts[1]
+    cursor = decode_cursor(parts[3]) if len(parts) == 4 else None
 
     # Get orders
-    if filter_type == "all":
-        orders = await order_repo.get_all_orders(limit=10)
-    else:
-        orders = await order_repo.get_all_orders(status=filter_type, limit=10)
+    page = await order_repo.get_all_orders(
+        status=None if filter_type == "all" else filter_type,
+        limit=10,
+        cursor=cursor,
+        newer=cursor is not None and parts[2] == PREV
+    )
 
-    if not orders:
+    if not page.orders:
         text = get_text(user.language, "no_orders")
         keyboard = get_orders_filter_menu(user.language)
         await callback.message.edit_text(text, reply_markup=keyboard)
@@ -126,7 +158,13 @@ async def show_orders_list(callback: CallbackQuery, user: User, order_repo: Orde
         return
 
     text = get_text(user.language, "orders_list")
-    keyboard = get_admin_orders_list(user.language, orders)
+    keyboard = get_admin_orders_list(
+        user.language,
+        page.orders,
+        filter_type,
+        page.next_cursor,
+        page.prev_cursor
+    )
 
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
@@ -142,23 +180,33 @@ async def show_order_details(callback: CallbackQuery, user: User, order_repo: Or
         await callback.answer("Order not found", show_alert=True)
         return
 
-    method_name = get_text(user.language, f"method_{order.payment_method.lower()}")
-    status_name = get_text(user.language, f"status_{order.status.lower()}")
+    text = _order_admin_text(user.language, order)
+    keyboard = get_order_admin_actions(user.language, order.id, order.status)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer()
+
 
-    text = get_text(
-        user.language,
-        "order_admin_details",
-        id=order.id,
-        user_id=order.user_id,
-        service=order.service_name,
-        total=float(order.total_amount),
-        method=method_name,
-        status=status_name,
-        created_at=order.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    )
+@router.callback_query(F.data.startswith("admin_digest_order:"))
+async def show_digest_order(
+    callback: CallbackQuery,
+    user: User,
+    order_repo: OrderRepository,
+    admin_filter: AdminFilter
+):
+    """Open order from a notification digest as a new message, keeping the digest."""
+    if not await admin_filter(callback):
+        await callback.answer()
+        return
 
+    order_id = int(callback.data.split(":")[1])
+    order = await order_repo.get(order_id)
+    if not order:
+        await callback.answer("Order not found", show_alert=True)
+        return
+
+    text = _order_admin_text(user.language, order)
     keyboard = get_order_admin_actions(user.language, order.id, order.status)
-    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
 
 
@@ -167,57 +215,51 @@ async def update_order_status(
     callback: CallbackQuery,
     user: User,
     order_repo: OrderRepository,
-    bot: Bot
+    bot: Bot,
+    metrics: Metrics
 ):
     """Update order status."""
     parts = callback.data.split(":")
     order_id = int(parts[1])
     new_status = parts[2]
 
-    # Update status
+    # Update status (only if allowed from the current one) and get owner's language
     completed_at = datetime.now() if new_status == OrderStatus.COMPLETED else None
-    await order_repo.update_status(order_id, new_status, completed_at=completed_at)
+    result = await order_repo.transition(order_id, new_status, completed_at=completed_at)
+
+    if result is None:
+        # Changed by another admin meanwhile or no longer exists
+        order = await order_repo.get(order_id)
+        if not order:
+            await callback.answer("Order not found", show_alert=True)
+            return
+        text = _order_admin_text(user.language, order)
+        keyboard = get_order_admin_actions(user.language, order.id, order.status)
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+        await callback.answer(get_text(user.language, "order_status_conflict"), show_alert=True)
+        return
 
-    # Get updated order
-    order = await order_repo.get(order_id)
+    order, owner_language = result
 
     # Notify user about status change
-    try:
-        from bot.models.user import UserRepository
-        user_repo = UserRepository(order_repo.db)
-        order_user = await user_repo.get(order.user_id)
-
-        if order_user:
-            if new_status == OrderStatus.COMPLETED:
-                notification = f"✅ Ваш заказ #{order_id} успешно выполнен!"
-            else:
-                notification = f"❌ Ваш заказ #{order_id} был отклонен."
+    if owner_language:
+        if new_status == OrderStatus.COMPLETED:
+            notification = f"✅ Ваш заказ #{order_id} успешно выполнен!"
+        else:
+            notification = f"❌ Ваш заказ #{order_id} был отклонен."
 
-            keyboard = get_main_menu(order_user.language)
+        try:
             await bot.send_message(
                 order.user_id,
                 notification,
-                reply_markup=keyboard
+                reply_markup=get_main_menu(owner_language)
             )
-    except Exception:
-        pass
+        except Exception as e:
+            # User blocked the bot etc.; the status change itself succeeded
+            metrics.swallowed("admin.notify_owner", e)
 
     # Show updated order details
-    method_name = get_text(user.language, f"method_{order.payment_method.lower()}")
-    status_name = get_text(user.language, f"status_{order.status.lower()}")
-
-    text = get_text(
-        user.language,
-        "order_admin_details",
-        id=order.id,
-        user_id=order.user_id,
-        service=order.service_name,
-        total=float(order.total_amount),
-        method=method_name,
-        status=status_name,
-        created_at=order.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    )
-
+    text = _order_admin_text(user.language, order)
     keyboard = get_order_admin_actions(user.language, order.id, order.status)
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer(get_text(user.language, "order_status_updated"))
@@ -254,10 +296,9 @@ async def confirm_broadcast(
     callback: CallbackQuery,
     user: User,
     state: FSMContext,
-    user_repo: UserRepository,
-    bot: Bot
+    broadcast_engine: BroadcastEngine
 ):
-    """Confirm and send broadcast."""
+    """Confirm broadcast and start sending it in the background."""
     data = await state.get_data()
     broadcast_text = data.get("broadcast_text")
 
@@ -265,25 +306,90 @@ async def confirm_broadcast(
         await callback.answer("Error: No text", show_alert=True)
         return
 
-    # Get all users
-    users = await user_repo.get_all_users()
+    text = get_text(user.language, "broadcast_started")
+    await callback.message.edit_text(text)
 
-    # Send broadcast
-    sent_count = 0
-    for target_user in users:
-        if not target_user.is_blocked:
-            try:
-                await bot.send_message(target_user.telegram_id, broadcast_text)
-                sent_count += 1
-            except Exception:
-                pass
+    # Progress is reported by editing this message
+    await broadcast_engine.start(
+        Broadcast(
+            text=broadcast_text,
+            created_by=user.telegram_id,
+            language=user.language,
+            progress_chat_id=callback.message.chat.id,
+            progress_message_id=callback.message.message_id
+        )
+    )
 
-    text = get_text(user.language, "broadcast_sent", count=sent_count)
-    await callback.message.edit_text(text)
     await state.clear()
     await callback.answer()
 
 
+async def _write_csv(
+    path: str,
+    header: Sequence[str],
+    records: AsyncIterator[Sequence],
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> int:
+    """Write records to a CSV file in chunks, off the event loop; returns number of records.
+
+    File operations run in a thread, each chunk's write overlapping the
+    fetch of the next one. The records iterator is closed (releasing its
+    connection) before returning.
+    """
+    f = await asyncio.to_thread(open, path, "w", encoding="utf-8", newline="")
+    writer = csv.writer(f)
+    writing: Optional[asyncio.Future] = None
+    count = 0
+    try:
+        chunk = [header]
+        async with aclosing(records) as rows:
+            async for record in rows:
+                chunk.append(tuple(record))
+                count += 1
+                if len(chunk) >= chunk_size:
+                    if writing:
+                        await writing
+                    writing = asyncio.ensure_future(asyncio.to_thread(writer.writerows, chunk))
+                    chunk = []
+        if writing:
+            await writing
+        await asyncio.to_thread(writer.writerows, chunk)
+    finally:
+        # A chunk may still be being written if fetching failed
+        if writing:
+            await asyncio.gather(writing, return_exceptions=True)
+        await asyncio.to_thread(f.close)
+    return count
+
+
+@router.callback_query(F.data == "admin_users_export")
+async def export_users(
+    callback: CallbackQuery,
+    user: User,
+    user_repo: UserRepository,
+    admin_filter: AdminFilter
+):
+    """Send active users as CSV, streamed from a cursor into a temporary file."""
+    if not await admin_filter(callback):
+        await callback.answer()
+        return
+    await callback.answer()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.csv")
+        count = await _write_csv(
+            path,
+            ("telegram_id", "username", "first_name", "language"),
+            user_repo.iter_active_users()
+        )
+
+        # The cursor's connection is back in the pool before the upload starts
+        await callback.message.answer_document(
+            FSInputFile(path),
+            caption=get_text(user.language, "users_export", count=count)
+        )
+
+
 @router.callback_query(F.data == "admin_settings")
 async def show_settings(callback: CallbackQuery, user: User):
     """Show settings menu (placeholder)."""
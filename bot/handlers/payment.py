@@ -1,21 +1,27 @@
 """Payment flow handlers."""
+import secrets
 from datetime import datetime
-from decimal import Decimal
-from aiogram import Router, F, Bot
+from decimal import Decimal, InvalidOperation
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from bot.models.user import User
-from bot.models.order import Order, OrderRepository, OrderStatus, PaymentMethod
+from bot.models.order import ActiveOrderExistsError, Order, OrderRepository, OrderStatus, PaymentMethod
 from bot.models.settings import SettingsRepository
+from bot.services.fx import RateProvider
+from bot.services.notifier import AdminNotifier
 from bot.utils.texts import get_text
 from bot.utils.commission import calculate_commission, calculate_payment_amount
 from bot.keyboards.inline import (
     get_payment_methods,
     get_payment_confirmation,
     get_active_order_menu,
-    get_main_menu
+    get_main_menu,
+    get_order_admin_actions,
+    get_order_details_menu
 )
 
 router = Router()
@@ -29,6 +35,39 @@ class PaymentStates(StatesGroup):
     waiting_for_confirmation = State()
 
 
+def _order_details_text(language: str, order: Order) -> str:
+    """Render order details for its owner."""
+    return get_text(
+        language,
+        "order_details",
+        id=order.id,
+        service=order.service_name,
+        base_amount=float(order.base_amount),
+        commission=float(order.commission_amount),
+        total=float(order.total_amount),
+        method=get_text(language, f"method_{order.payment_method.lower()}"),
+        status=get_text(language, f"status_{order.status.lower()}"),
+        created_at=order.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
+async def _show_status_conflict(
+    callback: CallbackQuery,
+    user: User,
+    order_repo: OrderRepository,
+    order_id: int
+):
+    """Show current state of the user's order whose status no longer allows the action (e.g. a stale button)."""
+    order = await order_repo.get(order_id)
+    if not order or order.user_id != user.telegram_id:
+        await callback.answer("Order not found", show_alert=True)
+        return
+    text = _order_details_text(user.language, order)
+    keyboard = get_order_details_menu(user.language)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer(get_text(user.language, "order_status_conflict"), show_alert=True)
+
+
 @router.callback_query(F.data == "payment_start")
 async def start_payment(
     callback: CallbackQuery,
@@ -51,9 +90,10 @@ async def start_payment(
         await callback.answer()
         return
 
-    # Start payment flow
+    # Start payment flow; the nonce makes its order idempotent
     text = get_text(user.language, "enter_service")
     await callback.message.edit_text(text)
+    await state.update_data(flow_id=secrets.token_hex(8))
     await state.set_state(PaymentStates.waiting_for_service)
     await callback.answer()
 
@@ -73,19 +113,28 @@ async def process_service(message: Message, user: User, state: FSMContext):
 
 
 @router.message(PaymentStates.waiting_for_amount)
-async def process_amount(message: Message, user: User, state: FSMContext):
+async def process_amount(
+    message: Message,
+    user: User,
+    state: FSMContext,
+    settings_repo: SettingsRepository
+):
     """Process amount input."""
     try:
         amount = Decimal(message.text.strip())
-        if amount <= 0:
+        if not amount.is_finite() or amount <= 0:
             raise ValueError("Amount must be positive")
-    except (ValueError, Exception):
+    except (InvalidOperation, ValueError, AttributeError):
+        # Not a number (or not text at all); ordinary user input, not counted
         text = get_text(user.language, "invalid_amount")
         await message.answer(text)
         return
 
     # Calculate commission
-    commission_rate, commission_amount = calculate_commission(amount)
+    commission_rate, commission_amount = calculate_commission(
+        amount,
+        await settings_repo.get_commission_schedule()
+    )
     total_amount = amount + commission_amount
 
     # Save data
@@ -122,8 +171,8 @@ async def process_payment_method(
     state: FSMContext,
     order_repo: OrderRepository,
     settings_repo: SettingsRepository,
-    bot: Bot,
-    config
+    admin_notifier: AdminNotifier,
+    fx_rates: RateProvider
 ):
     """Process payment method selection."""
     payment_method = callback.data.split(":")[1]
@@ -131,12 +180,13 @@ async def process_payment_method(
     # Get state data
     data = await state.get_data()
 
-    # Calculate payment amount
+    # Calculate payment amount (rate is served from memory, never fetched here)
     total_amount = Decimal(str(data["total_amount"]))
+    exchange_rate = fx_rates.rate
     payment_amount, payment_currency = calculate_payment_amount(
         total_amount,
         payment_method,
-        config.bot.usd_to_rub_rate
+        exchange_rate
     )
 
     # Create order
@@ -150,16 +200,31 @@ async def process_payment_method(
         payment_method=payment_method,
         payment_amount=payment_amount,
         payment_currency=payment_currency,
-        status=OrderStatus.PENDING
+        status=OrderStatus.PENDING,
+        exchange_rate=exchange_rate if payment_currency == "RUB" else None,
+        # Flows started before flow_id existed are not deduplicated
+        idempotency_key=f"{user.telegram_id}:{data['flow_id']}" if "flow_id" in data else None
     )
 
-    order = await order_repo.create(order)
+    try:
+        order, created = await order_repo.create(order)
+    except ActiveOrderExistsError:
+        # Another order was created meanwhile (e.g. a second device)
+        await state.clear()
+        active_order = await order_repo.get_active_order(user.telegram_id)
+        if active_order:
+            text = get_text(user.language, "active_order_exists", order_id=active_order.id)
+            keyboard = get_active_order_menu(user.language, active_order.id)
+            await callback.message.edit_text(text, reply_markup=keyboard)
+        await callback.answer()
+        return
 
-    # Get requisites
-    requisites = await settings_repo.get_payment_requisites(payment_method)
+    # On a repeated tap of this flow (e.g. a double tap on a slow connection)
+    # order is the one the first tap created: show it, possibly again
+    requisites = await settings_repo.get_payment_requisites(order.payment_method)
 
     # Get payment method name
-    method_name = get_text(user.language, f"method_{payment_method.lower()}")
+    method_name = get_text(user.language, f"method_{order.payment_method.lower()}")
 
     # Show payment details
     text = get_text(
@@ -167,20 +232,30 @@ async def process_payment_method(
         "payment_details",
         order_id=order.id,
         service=order.service_name,
-        amount=f"{payment_amount:.2f}",
-        currency=payment_currency,
+        amount=f"{order.payment_amount:.2f}",
+        currency=order.payment_currency,
         method=method_name,
         requisites=requisites or "Не указаны / Not specified"
     )
     keyboard = get_payment_confirmation(user.language)
 
-    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # The first tap has already shown exactly these details
+        if created or "message is not modified" not in e.message:
+            raise
     await state.update_data(order_id=order.id)
     await state.set_state(PaymentStates.waiting_for_confirmation)
 
+    if not created:
+        # Admins were notified about this order by the first tap
+        await callback.answer()
+        return
+
     # Notify admins about new order
-    if config.bot.admin_chat_id:
-        admin_text = get_text(
+    admin_notifier.notify(
+        get_text(
             "ru",
             "new_order_notification",
             id=order.id,
@@ -188,15 +263,9 @@ async def process_payment_method(
             service=order.service_name,
             amount=float(order.total_amount),
             method=method_name
-        )
-        try:
-            await bot.send_message(
-                config.bot.admin_chat_id,
-                admin_text,
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass
+        ),
+        order_id=order.id
+    )
 
     await callback.answer()
 
@@ -208,8 +277,7 @@ async def confirm_payment(
     state: FSMContext,
     order_repo: OrderRepository,
     settings_repo: SettingsRepository,
-    bot: Bot,
-    config
+    admin_notifier: AdminNotifier
 ):
     """Confirm payment from user."""
     data = await state.get_data()
@@ -219,18 +287,18 @@ async def confirm_payment(
         await callback.answer("Error: Order not found", show_alert=True)
         return
 
-    # Get order
-    order = await order_repo.get(order_id)
-    if not order:
-        await callback.answer("Error: Order not found", show_alert=True)
-        return
-
-    # Update order status
-    await order_repo.update_status(
+    # Update order status (only the user's own order, only if still pending)
+    result = await order_repo.transition(
         order_id,
         OrderStatus.PAID_USER,
-        paid_at=datetime.now()
+        paid_at=datetime.now(),
+        user_id=user.telegram_id
     )
+    if result is None:
+        await state.clear()
+        await _show_status_conflict(callback, user, order_repo, order_id)
+        return
+    order, _ = result
 
     # Get instruction
     instruction = await settings_repo.get_instruction(user.language)
@@ -255,8 +323,8 @@ async def confirm_payment(
     await state.clear()
 
     # Notify admins
-    if config.bot.admin_chat_id:
-        admin_text = get_text(
+    admin_notifier.notify(
+        get_text(
             "ru",
             "payment_notification",
             id=order.id,
@@ -265,18 +333,10 @@ async def confirm_payment(
             currency=order.payment_currency,
             method=method_name,
             datetime=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        )
-        try:
-            from bot.keyboards.inline import get_order_admin_actions
-            admin_keyboard = get_order_admin_actions("ru", order.id, OrderStatus.PAID_USER)
-            await bot.send_message(
-                config.bot.admin_chat_id,
-                admin_text,
-                reply_markup=admin_keyboard,
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass
+        ),
+        order_id=order.id,
+        reply_markup=get_order_admin_actions("ru", order.id, OrderStatus.PAID_USER)
+    )
 
     await callback.answer()
 
@@ -293,7 +353,12 @@ async def cancel_order(
     order_id = data.get("order_id")
 
     if order_id:
-        await order_repo.update_status(order_id, OrderStatus.REJECTED)
+        # Only the user's own order, only while it is still active
+        result = await order_repo.transition(order_id, OrderStatus.REJECTED, user_id=user.telegram_id)
+        if result is None:
+            await state.clear()
+            await _show_status_conflict(callback, user, order_repo, order_id)
+            return
 
     text = get_text(user.language, "order_cancelled", order_id=order_id or "N/A")
     keyboard = get_main_menu(user.language)
@@ -312,7 +377,9 @@ async def cancel_order_by_id(
     """Cancel order by ID."""
     order_id = int(callback.data.split(":")[1])
 
-    await order_repo.update_status(order_id, OrderStatus.REJECTED)
+    if await order_repo.transition(order_id, OrderStatus.REJECTED, user_id=user.telegram_id) is None:
+        await _show_status_conflict(callback, user, order_repo, order_id)
+        return
 
     text = get_text(user.language, "order_cancelled", order_id=order_id)
     keyboard = get_main_menu(user.language)
@@ -335,24 +402,8 @@ async def view_order(
         await callback.answer("Order not found", show_alert=True)
         return
 
-    method_name = get_text(user.language, f"method_{order.payment_method.lower()}")
-    status_name = get_text(user.language, f"status_{order.status.lower()}")
-
-    text = get_text(
-        user.language,
-        "order_details",
-        id=order.id,
-        service=order.service_name,
-        base_amount=float(order.base_amount),
-        commission=float(order.commission_amount),
-        total=float(order.total_amount),
-        method=method_name,
-        status=status_name,
-        created_at=order.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    )
-
-    from bot.keyboards.inline import get_order_details_menu
+    text = _order_details_text(user.language, order)
     keyboard = get_order_details_menu(user.language)
-
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
+
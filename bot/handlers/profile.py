@@ -7,6 +7,7 @@ from bot.models.user import User
 from bot.models.order import OrderRepository
 from bot.utils.texts import get_text
 from bot.keyboards.inline import get_profile_menu, get_orders_list, get_order_details_menu
+from bot.utils.pagination import PREV, decode_cursor
 
 router = Router()
 
@@ -39,12 +40,20 @@ async def show_profile(callback: CallbackQuery, user: User, order_repo: OrderRep
     await callback.answer()
 
 
-@router.callback_query(F.data == "my_orders")
+@router.callback_query(F.data.startswith("my_orders"))
 async def show_my_orders(callback: CallbackQuery, user: User, order_repo: OrderRepository):
-    """Show user orders."""
-    orders = await order_repo.get_user_orders(user.telegram_id, limit=10)
+    """Show user orders (my_orders[:<direction>:<cursor>])."""
+    parts = callback.data.split(":")
+    cursor = decode_cursor(parts[2]) if len(parts) == 3 else None
 
-    if not orders:
+    page = await order_repo.get_user_orders(
+        user.telegram_id,
+        limit=10,
+        cursor=cursor,
+        newer=cursor is not None and parts[1] == PREV
+    )
+
+    if not page.orders:
         text = get_text(user.language, "no_orders")
         keyboard = get_profile_menu(user.language)
         await callback.message.edit_text(text, reply_markup=keyboard)
@@ -52,7 +61,7 @@ async def show_my_orders(callback: CallbackQuery, user: User, order_repo: OrderR
         return
 
     text = get_text(user.language, "my_orders")
-    keyboard = get_orders_list(user.language, orders)
+    keyboard = get_orders_list(user.language, page.orders, page.next_cursor, page.prev_cursor)
 
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
@@ -1,9 +1,83 @@
-"""Inline keyboard layouts."""
+"""Inline keyboard layouts.
+
+Keyboards that depend only on language are built once per language and
+shared; keyboards for a particular order are kept in a bounded LRU cache.
+The cache holds immutable rows of frozen buttons, every call wraps them
+in a new markup, so a handler changing its markup changes nobody else's.
+"""
+from functools import lru_cache, wraps
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pydantic import ConfigDict
+from typing import Callable, Iterable, Optional, Tuple
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from bot.utils.texts import get_text
+from bot.models.order import OrderStatus, can_transition
+from bot.utils.texts import TEXTS, get_text
+from bot.utils.pagination import Cursor, NEXT, PREV, encode_cursor
 
+# Static keyboards are cached per language, order keyboards per (language, order)
+STATIC_CACHE_SIZE = 16
+ORDER_CACHE_SIZE = 1024
 
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+    """Button of a cached keyboard; assigning to its fields raises."""
+    model_config = ConfigDict(frozen=True)
+
+
+Rows = Tuple[Tuple[FrozenInlineKeyboardButton, ...], ...]
+
+
+def _freeze(markup: InlineKeyboardMarkup) -> Rows:
+    """Convert markup to immutable rows of frozen buttons."""
+    return tuple(
+        tuple(FrozenInlineKeyboardButton(**button.model_dump(exclude_none=True)) for button in row)
+        for row in markup.inline_keyboard
+    )
+
+
+def _cached(maxsize: int) -> Callable[[Callable[..., InlineKeyboardMarkup]], Callable[..., InlineKeyboardMarkup]]:
+    """Cache keyboard builder's rows in an LRU cache, returning a new markup per call."""
+    def decorator(build: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+        rows = lru_cache(maxsize=maxsize)(lambda *args: _freeze(build(*args)))
+
+        @wraps(build)
+        def get(*args) -> InlineKeyboardMarkup:
+            return InlineKeyboardMarkup(inline_keyboard=[list(row) for row in rows(*args)])
+
+        get.cache_info = rows.cache_info
+        get.cache_clear = rows.cache_clear
+        return get
+    return decorator
+
+
+def _add_page_buttons(
+    builder: InlineKeyboardBuilder,
+    language: str,
+    callback_prefix: str,
+    next_cursor: Optional[Cursor],
+    prev_cursor: Optional[Cursor]
+):
+    """Add previous/next page row carrying keyset cursors in callback data."""
+    buttons = []
+    if prev_cursor:
+        buttons.append(
+            InlineKeyboardButton(
+                text=get_text(language, "btn_prev_page"),
+                callback_data=f"{callback_prefix}:{PREV}:{encode_cursor(prev_cursor)}"
+            )
+        )
+    if next_cursor:
+        buttons.append(
+            InlineKeyboardButton(
+                text=get_text(language, "btn_next_page"),
+                callback_data=f"{callback_prefix}:{NEXT}:{encode_cursor(next_cursor)}"
+            )
+        )
+    if buttons:
+        builder.row(*buttons)
+
+
+@_cached(STATIC_CACHE_SIZE)
 def get_main_menu(language: str) -> InlineKeyboardMarkup:
     """Get main menu keyboard."""
     builder = InlineKeyboardBuilder()
@@ -34,6 +108,7 @@ def get_main_menu(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_payment_methods(language: str) -> InlineKeyboardMarkup:
     """Get payment methods keyboard."""
     builder = InlineKeyboardBuilder()
@@ -78,6 +153,7 @@ def get_payment_methods(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_payment_confirmation(language: str) -> InlineKeyboardMarkup:
     """Get payment confirmation keyboard."""
     builder = InlineKeyboardBuilder()
@@ -98,6 +174,7 @@ def get_payment_confirmation(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(ORDER_CACHE_SIZE)
 def get_active_order_menu(language: str, order_id: int) -> InlineKeyboardMarkup:
     """Get active order menu keyboard."""
     builder = InlineKeyboardBuilder()
@@ -124,6 +201,7 @@ def get_active_order_menu(language: str, order_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_profile_menu(language: str) -> InlineKeyboardMarkup:
     """Get profile menu keyboard."""
     builder = InlineKeyboardBuilder()
@@ -144,7 +222,12 @@ def get_profile_menu(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_orders_list(language: str, orders: list, page: int = 0) -> InlineKeyboardMarkup:
+def get_orders_list(
+    language: str,
+    orders: list,
+    next_cursor: Optional[Cursor] = None,
+    prev_cursor: Optional[Cursor] = None
+) -> InlineKeyboardMarkup:
     """Get orders list keyboard."""
     builder = InlineKeyboardBuilder()
 
@@ -159,6 +242,8 @@ def get_orders_list(language: str, orders: list, page: int = 0) -> InlineKeyboar
             )
         )
 
+    _add_page_buttons(builder, language, "my_orders", next_cursor, prev_cursor)
+
     # Back button
     builder.row(
         InlineKeyboardButton(
@@ -170,6 +255,7 @@ def get_orders_list(language: str, orders: list, page: int = 0) -> InlineKeyboar
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_order_details_menu(language: str) -> InlineKeyboardMarkup:
     """Get order details menu keyboard."""
     builder = InlineKeyboardBuilder()
@@ -184,6 +270,7 @@ def get_order_details_menu(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_language_menu() -> InlineKeyboardMarkup:
     """Get language selection keyboard."""
     builder = InlineKeyboardBuilder()
@@ -206,38 +293,56 @@ def get_language_menu() -> InlineKeyboardMarkup:
 
 def get_info_menu(language: str, settings: dict) -> InlineKeyboardMarkup:
     """Get info menu keyboard with links from settings."""
+    return _get_info_menu(
+        language,
+        settings.get("info_channel_url"),
+        settings.get("info_support_url"),
+        settings.get("info_terms_url"),
+        settings.get("info_refund_url")
+    )
+
+
+@_cached(STATIC_CACHE_SIZE)
+def _get_info_menu(
+    language: str,
+    channel_url: Optional[str],
+    support_url: Optional[str],
+    terms_url: Optional[str],
+    refund_url: Optional[str]
+) -> InlineKeyboardMarkup:
+    """Build info menu keyboard (cached by language and URLs)."""
     builder = InlineKeyboardBuilder()
 
     # Add buttons with URLs from settings
-    if settings.get("info_channel_url"):
+    if channel_url:
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_channel"),
-                url=settings["info_channel_url"]
+                url=channel_url
             )
         )
 
-    if settings.get("info_support_url"):
+    if support_url:
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_support"),
-                url=settings["info_support_url"]
+                url=support_url
             )
         )
 
-    if settings.get("info_terms_url"):
+    if terms_url:
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_terms"),
-                url=settings["info_terms_url"]
+                url=terms_url
             )
         )
 
-    if settings.get("info_refund_url"):
+    if refund_url:
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_refund"),
-                url=settings["info_refund_url"]
+                url=refund_url
             )
         )
 
@@ -252,6 +357,7 @@ def get_info_menu(language: str, settings: dict) -> InlineKeyboardMarkup:
 
 
 # Admin keyboards
+@_cached(STATIC_CACHE_SIZE)
 def get_admin_menu(language: str) -> InlineKeyboardMarkup:
     """Get admin panel keyboard."""
     builder = InlineKeyboardBuilder()
@@ -280,10 +386,17 @@ def get_admin_menu(language: str) -> InlineKeyboardMarkup:
             callback_data="admin_broadcast"
         )
     )
+    builder.row(
+        InlineKeyboardButton(
+            text=get_text(language, "btn_users"),
+            callback_data="admin_users_export"
+        )
+    )
 
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_stats_period_menu(language: str) -> InlineKeyboardMarkup:
     """Get statistics period selection keyboard."""
     builder = InlineKeyboardBuilder()
@@ -312,6 +425,7 @@ def get_stats_period_menu(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_orders_filter_menu(language: str) -> InlineKeyboardMarkup:
     """Get orders filter keyboard."""
     builder = InlineKeyboardBuilder()
@@ -348,11 +462,17 @@ def get_orders_filter_menu(language: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_admin_orders_list(language: str, orders: list) -> InlineKeyboardMarkup:
+def get_admin_orders_list(
+    language: str,
+    orders: list,
+    filter_type: str = "all",
+    next_cursor: Optional[Cursor] = None,
+    prev_cursor: Optional[Cursor] = None
+) -> InlineKeyboardMarkup:
     """Get admin orders list keyboard."""
     builder = InlineKeyboardBuilder()
 
-    for order in orders[:10]:  # Limit to 10 orders per page
+    for order in orders:
         status_text = get_text(language, f"status_{order.status.lower()}")
         button_text = f"#{order.id} - ${order.total_amount:.2f} - {status_text}"
         builder.row(
@@ -362,6 +482,8 @@ def get_admin_orders_list(language: str, orders: list) -> InlineKeyboardMarkup:
             )
         )
 
+    _add_page_buttons(builder, language, f"admin_orders_filter:{filter_type}", next_cursor, prev_cursor)
+
     builder.row(
         InlineKeyboardButton(
             text=get_text(language, "btn_back"),
@@ -372,11 +494,12 @@ def get_admin_orders_list(language: str, orders: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_cached(ORDER_CACHE_SIZE)
 def get_order_admin_actions(language: str, order_id: int, current_status: str) -> InlineKeyboardMarkup:
     """Get order admin actions keyboard."""
     builder = InlineKeyboardBuilder()
 
-    if current_status != "COMPLETED":
+    if can_transition(current_status, OrderStatus.COMPLETED):
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_complete"),
@@ -384,7 +507,7 @@ def get_order_admin_actions(language: str, order_id: int, current_status: str) -
             )
         )
 
-    if current_status not in ["REJECTED", "COMPLETED"]:
+    if can_transition(current_status, OrderStatus.REJECTED):
         builder.row(
             InlineKeyboardButton(
                 text=get_text(language, "btn_reject"),
@@ -402,6 +525,7 @@ def get_order_admin_actions(language: str, order_id: int, current_status: str) -
     return builder.as_markup()
 
 
+@_cached(STATIC_CACHE_SIZE)
 def get_broadcast_confirm(language: str) -> InlineKeyboardMarkup:
     """Get broadcast confirmation keyboard."""
     builder = InlineKeyboardBuilder()
@@ -420,3 +544,21 @@ def get_broadcast_confirm(language: str) -> InlineKeyboardMarkup:
     )
 
     return builder.as_markup()
+
+
+def prewarm(languages: Iterable[str] = TEXTS) -> None:
+    """Build static keyboards for every language ahead of the first update."""
+    get_language_menu()
+    for language in languages:
+        for build in (
+            get_main_menu,
+            get_payment_methods,
+            get_payment_confirmation,
+            get_profile_menu,
+            get_order_details_menu,
+            get_admin_menu,
+            get_stats_period_menu,
+            get_orders_filter_menu,
+            get_broadcast_confirm
+        ):
+            build(language)
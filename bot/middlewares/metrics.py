@@ -0,0 +1,67 @@
+"""Middlewares timing updates, handlers and Bot API requests."""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED as UNHANDLED_RESULT
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from bot.utils.metrics import Metrics, add_api_time, current_update, start_update
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Outer update middleware timing each update end to end."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Time update and record it under the handler that took it."""
+        timing = start_update()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.metrics.observe(timing, "error")
+            raise
+        self.metrics.observe(timing, "unhandled" if result is UNHANDLED_RESULT else "ok")
+        return result
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Inner middleware telling MetricsMiddleware which handler took the update."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Label current update with handler name."""
+        timing = current_update()
+        if timing is not None:
+            timing.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+class ApiTimingMiddleware(BaseRequestMiddleware):
+    """Session middleware attributing Bot API request time to the current update."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ):
+        """Time request."""
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            add_api_time(time.perf_counter() - started)
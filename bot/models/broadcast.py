@@ -0,0 +1,195 @@
+"""Broadcast model and database operations."""
+from datetime import datetime
+from typing import Optional, List, Dict
+import asyncpg
+
+
+class BroadcastStatus:
+    """Broadcast status constants."""
+    RUNNING = "RUNNING"
+    FINISHED = "FINISHED"
+
+
+class DeliveryStatus:
+    """Per-recipient delivery status constants."""
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+
+class Broadcast:
+    """Broadcast model."""
+
+    def __init__(
+        self,
+        id: Optional[int] = None,
+        text: str = None,
+        created_by: int = None,
+        language: str = "ru",
+        progress_chat_id: Optional[int] = None,
+        progress_message_id: Optional[int] = None,
+        status: str = BroadcastStatus.RUNNING,
+        lease_until: Optional[datetime] = None,
+        owner: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        finished_at: Optional[datetime] = None
+    ):
+        self.id = id
+        self.text = text
+        self.created_by = created_by
+        self.language = language
+        self.progress_chat_id = progress_chat_id
+        self.progress_message_id = progress_message_id
+        self.status = status
+        self.lease_until = lease_until
+        self.owner = owner
+        self.created_at = created_at
+        self.finished_at = finished_at
+
+    @classmethod
+    def from_record(cls, record: asyncpg.Record) -> "Broadcast":
+        """Create Broadcast instance from database record."""
+        return cls(
+            id=record["id"],
+            text=record["text"],
+            created_by=record["created_by"],
+            language=record["language"],
+            progress_chat_id=record["progress_chat_id"],
+            progress_message_id=record["progress_message_id"],
+            status=record["status"],
+            lease_until=record["lease_until"],
+            owner=record["owner"],
+            created_at=record["created_at"],
+            finished_at=record["finished_at"]
+        )
+
+
+class BroadcastRepository:
+    """Broadcast database operations.
+
+    A running broadcast is leased by the bot instance delivering it, so after
+    a restart only broadcasts whose lease expired are picked up and several
+    replicas never deliver the same broadcast. Only the lease owner can
+    renew or release it; an instance whose lease expired and was claimed by
+    another finds out on the next renewal.
+    """
+
+    STATEMENTS = {
+        # Broadcast and its recipients (all not blocked users) in one statement
+        "broadcasts.create": """
+            WITH broadcast AS (
+                INSERT INTO broadcasts (
+                    text, created_by, language, progress_chat_id, progress_message_id,
+                    lease_until, owner
+                )
+                VALUES ($1, $2, $3, $4, $5, NOW() + make_interval(secs => $6), $7)
+                RETURNING *
+            ), recipients AS (
+                INSERT INTO broadcast_recipients (broadcast_id, user_id)
+                SELECT broadcast.id, users.telegram_id
+                FROM broadcast, users
+                WHERE NOT users.is_blocked
+            )
+            SELECT * FROM broadcast
+        """,
+        "broadcasts.claim_stale": """
+            UPDATE broadcasts
+            SET lease_until = NOW() + make_interval(secs => $1), owner = $2
+            WHERE status = 'RUNNING' AND lease_until < NOW()
+            RETURNING *
+        """,
+        "broadcasts.renew_lease": """
+            UPDATE broadcasts
+            SET lease_until = NOW() + make_interval(secs => $2)
+            WHERE id = $1 AND owner = $3
+            RETURNING id
+        """,
+        "broadcasts.release_lease": """
+            UPDATE broadcasts
+            SET lease_until = NOW()
+            WHERE id = $1 AND owner = $2 AND status = 'RUNNING'
+        """,
+        "broadcasts.get_counts": """
+            SELECT status, COUNT(*) AS count
+            FROM broadcast_recipients
+            WHERE broadcast_id = $1
+            GROUP BY status
+        """,
+        "broadcasts.get_pending": """
+            SELECT user_id FROM broadcast_recipients
+            WHERE broadcast_id = $1 AND status = 'PENDING' AND user_id > $2
+            ORDER BY user_id
+            LIMIT $3
+        """,
+        "broadcasts.save_results": """
+            UPDATE broadcast_recipients
+            SET status = results.status, error = results.error, updated_at = NOW()
+            FROM unnest($2::bigint[], $3::varchar[], $4::text[])
+                AS results(user_id, status, error)
+            WHERE broadcast_recipients.broadcast_id = $1
+              AND broadcast_recipients.user_id = results.user_id
+        """,
+        "broadcasts.finish": """
+            UPDATE broadcasts
+            SET status = 'FINISHED', finished_at = NOW()
+            WHERE id = $1
+        """,
+    }
+
+    def __init__(self, db):
+        self.db = db
+        # Only admins and the broadcast engine use these, prepared on first use
+        db.register_many(self.STATEMENTS, lazy=self.STATEMENTS)
+
+    async def create(self, broadcast: Broadcast, lease: float, owner: str) -> Broadcast:
+        """Create broadcast addressed to every not blocked user and lease it to owner."""
+        record = await self.db.fetchrow_named(
+            "broadcasts.create",
+            broadcast.text,
+            broadcast.created_by,
+            broadcast.language,
+            broadcast.progress_chat_id,
+            broadcast.progress_message_id,
+            lease,
+            owner
+        )
+        return Broadcast.from_record(record)
+
+    async def claim_stale(self, lease: float, owner: str) -> List[Broadcast]:
+        """Lease unfinished broadcasts nobody is delivering to owner (to resume after restart)."""
+        records = await self.db.fetch_named("broadcasts.claim_stale", lease, owner)
+        return [Broadcast.from_record(record) for record in records]
+
+    async def renew_lease(self, broadcast_id: int, lease: float, owner: str) -> bool:
+        """Extend lease of broadcast being delivered; False if owner no longer holds it."""
+        return await self.db.fetchval_named("broadcasts.renew_lease", broadcast_id, lease, owner) is not None
+
+    async def release_lease(self, broadcast_id: int, owner: str):
+        """Let another instance resume unfinished broadcast right away."""
+        await self.db.execute_named("broadcasts.release_lease", broadcast_id, owner)
+
+    async def get_counts(self, broadcast_id: int) -> Dict[str, int]:
+        """Get number of recipients per delivery status."""
+        records = await self.db.fetch_named("broadcasts.get_counts", broadcast_id)
+        counts = {DeliveryStatus.PENDING: 0, DeliveryStatus.SENT: 0, DeliveryStatus.FAILED: 0}
+        counts.update({record["status"]: record["count"] for record in records})
+        return counts
+
+    async def get_pending(self, broadcast_id: int, after_user_id: int, limit: int) -> List[int]:
+        """Get next batch of pending recipients ordered by user id."""
+        records = await self.db.fetch_named("broadcasts.get_pending", broadcast_id, after_user_id, limit)
+        return [record["user_id"] for record in records]
+
+    async def save_results(
+        self,
+        broadcast_id: int,
+        user_ids: List[int],
+        statuses: List[str],
+        errors: List[Optional[str]]
+    ):
+        """Store delivery results of a batch."""
+        await self.db.execute_named("broadcasts.save_results", broadcast_id, user_ids, statuses, errors)
+
+    async def finish(self, broadcast_id: int):
+        """Mark broadcast as finished."""
+        await self.db.execute_named("broadcasts.finish", broadcast_id)
@@ -1,9 +1,14 @@
 """Order model and database operations."""
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, AsyncIterator
 from decimal import Decimal
 import asyncpg
 
+from bot.utils.cache import TTLCache
+from bot.utils.pagination import Cursor
+
 
 class OrderStatus:
     """Order status constants."""
@@ -22,8 +27,42 @@ class PaymentMethod:
     LOLZ = "LOLZ"
 
 
+# Statuses an order may move to from each status
+ALLOWED_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    OrderStatus.PENDING: (OrderStatus.PAID_USER, OrderStatus.COMPLETED, OrderStatus.REJECTED),
+    OrderStatus.PAID_USER: (OrderStatus.COMPLETED, OrderStatus.REJECTED),
+    OrderStatus.COMPLETED: (),
+    OrderStatus.REJECTED: (),
+}
+
+
+def can_transition(current: str, new: str) -> bool:
+    """Check whether order in ``current`` status may move to ``new``."""
+    return new in ALLOWED_TRANSITIONS.get(current, ())
+
+
+class ActiveOrderExistsError(Exception):
+    """User already has an active (PENDING or PAID_USER) order."""
+
+    def __init__(self, user_id: int):
+        super().__init__(f"User {user_id} already has an active order")
+        self.user_id = user_id
+
+
 class Order:
-    """Order model."""
+    """Order model.
+
+    Slotted: bulk listings build thousands of these. ``from_record`` maps
+    columns by position, so every query feeding it must select
+    ORDER_COLUMNS in this order.
+    """
+
+    __slots__ = (
+        "id", "user_id", "service_name", "base_amount", "commission_rate",
+        "commission_amount", "total_amount", "payment_method", "payment_amount",
+        "payment_currency", "status", "created_at", "paid_at", "completed_at",
+        "updated_at", "exchange_rate", "idempotency_key"
+    )
 
     def __init__(
         self,
@@ -41,7 +80,9 @@ class Order:
         created_at: Optional[datetime] = None,
         paid_at: Optional[datetime] = None,
         completed_at: Optional[datetime] = None,
-        updated_at: Optional[datetime] = None
+        updated_at: Optional[datetime] = None,
+        exchange_rate: Optional[Decimal] = None,
+        idempotency_key: Optional[str] = None
     ):
         self.id = id
         self.user_id = user_id
@@ -58,48 +99,243 @@ class Order:
         self.paid_at = paid_at
         self.completed_at = completed_at
         self.updated_at = updated_at
+        # USD to RUB rate the payment amount was converted at (RUB payments only)
+        self.exchange_rate = exchange_rate
+        # Payment flow that created the order, see OrderRepository.create
+        self.idempotency_key = idempotency_key
+
+    @property
+    def cursor(self) -> Cursor:
+        """Keyset pagination position of the order."""
+        return self.created_at, self.id
 
     @classmethod
     def from_record(cls, record: asyncpg.Record) -> "Order":
-        """Create Order instance from database record."""
-        return cls(
-            id=record["id"],
-            user_id=record["user_id"],
-            service_name=record["service_name"],
-            base_amount=record["base_amount"],
-            commission_rate=record["commission_rate"],
-            commission_amount=record["commission_amount"],
-            total_amount=record["total_amount"],
-            payment_method=record["payment_method"],
-            payment_amount=record["payment_amount"],
-            payment_currency=record["payment_currency"],
-            status=record["status"],
-            created_at=record["created_at"],
-            paid_at=record["paid_at"],
-            completed_at=record["completed_at"],
-            updated_at=record["updated_at"]
-        )
+        """Create Order instance from record selecting ORDER_COLUMNS."""
+        return cls(*record)
+
+
+# Column list matching Order.__slots__ for SELECT/RETURNING
+ORDER_COLUMNS = ", ".join(Order.__slots__)
+
+
+class OrderPage:
+    """Page of orders (newest first) with cursors of neighbouring pages."""
+
+    def __init__(
+        self,
+        orders: List[Order],
+        next_cursor: Optional[Cursor] = None,
+        prev_cursor: Optional[Cursor] = None
+    ):
+        self.orders = orders
+        self.next_cursor = next_cursor    # continue with older orders
+        self.prev_cursor = prev_cursor    # go back to newer orders
+
+
+def _keyset_statements(name: str, where: str, offset: int) -> Dict[str, str]:
+    """Build first/older/newer page queries over (created_at, id).
+
+    ``where`` filters the scope using parameters $1..$offset; cursor and
+    limit parameters follow it.
+    """
+    cursor = f"(created_at, id) {{}} (${offset + 1}, ${offset + 2})"
+    and_ = " AND " if where else ""
+    where_cursor = f"WHERE {where}{and_}{cursor}"
+    return {
+        f"orders.{name}": f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            {"WHERE " + where if where else ""}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ${offset + 1}
+        """,
+        f"orders.{name}_older": f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            {where_cursor.format("<")}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ${offset + 3}
+        """,
+        f"orders.{name}_newer": f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            {where_cursor.format(">")}
+            ORDER BY created_at ASC, id ASC
+            LIMIT ${offset + 3}
+        """,
+    }
 
 
 class OrderRepository:
     """Order database operations."""
 
-    def __init__(self, db):
-        self.db = db
-
-    async def create(self, order: Order) -> Order:
-        """Create new order."""
-        query = """
+    STATEMENTS = {
+        "orders.create": f"""
             INSERT INTO orders (
                 user_id, service_name, base_amount, commission_rate,
                 commission_amount, total_amount, payment_method,
-                payment_amount, payment_currency, status
+                payment_amount, payment_currency, status, exchange_rate,
+                idempotency_key
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+            ON CONFLICT DO NOTHING
+            RETURNING {ORDER_COLUMNS}
+        """,
+        "orders.get": f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = $1",
+        "orders.get_by_idempotency_key": f"SELECT {ORDER_COLUMNS} FROM orders WHERE idempotency_key = $1",
+        **_keyset_statements("user_orders_page", "user_id = $1", 1),
+        **_keyset_statements("all_orders_page", "", 0),
+        **_keyset_statements("status_orders_page", "status = $1", 1),
+        "orders.get_active_order": f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            WHERE user_id = $1 AND status IN ('PENDING', 'PAID_USER')
+        """,
+        # Guarded update plus the owner's language in one round trip
+        "orders.transition": f"""
+            WITH updated AS (
+                UPDATE orders
+                SET status = $2, paid_at = COALESCE($3, paid_at),
+                    completed_at = COALESCE($4, completed_at)
+                WHERE id = $1 AND status = ANY($5::order_status[])
+                  AND ($6::bigint IS NULL OR user_id = $6)
+                RETURNING {ORDER_COLUMNS}
+            )
+            SELECT updated.*, users.language
+            FROM updated
+            LEFT JOIN users ON users.telegram_id = updated.user_id
+        """,
+        "orders.get_user_stats": """
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'COMPLETED') as completed_count,
+                COALESCE(SUM(total_amount) FILTER (WHERE status = 'COMPLETED'), 0) as total_spent,
+                MIN(created_at) FILTER (WHERE status = 'COMPLETED') as first_payment,
+                MAX(created_at) FILTER (WHERE status = 'COMPLETED') as last_payment
+            FROM orders
+            WHERE user_id = $1
+        """,
+        # Whole hours come from the rollup table, the partial hours at both
+        # ends of the range (including the live one) from orders
+        "orders.get_stats": """
+            WITH bounds AS (
+                SELECT
+                    CASE
+                        WHEN date_trunc('hour', $1::timestamp) = $1::timestamp THEN $1::timestamp
+                        ELSE date_trunc('hour', $1::timestamp) + INTERVAL '1 hour'
+                    END AS full_from,
+                    date_trunc('hour', $2::timestamp) AS full_to
+            ), parts AS (
+                SELECT
+                    SUM(total_orders) AS total_orders,
+                    SUM(completed_orders) AS completed_orders,
+                    SUM(turnover_usd) AS total_turnover_usd,
+                    SUM(commission_usd) AS total_commission_usd,
+                    SUM(turnover_rub) AS total_turnover_rub
+                FROM order_stats_hourly, bounds
+                WHERE bucket >= bounds.full_from AND bucket < bounds.full_to
+                UNION ALL
+                SELECT
+                    COUNT(*),
+                    COUNT(*) FILTER (WHERE status = 'COMPLETED'),
+                    SUM(total_amount),
+                    SUM(commission_amount),
+                    SUM(payment_amount) FILTER (WHERE payment_currency = 'RUB')
+                FROM orders, bounds
+                WHERE created_at >= $1 AND created_at < LEAST(bounds.full_from, $2 + INTERVAL '1 microsecond')
+                UNION ALL
+                SELECT
+                    COUNT(*),
+                    COUNT(*) FILTER (WHERE status = 'COMPLETED'),
+                    SUM(total_amount),
+                    SUM(commission_amount),
+                    SUM(payment_amount) FILTER (WHERE payment_currency = 'RUB')
+                FROM orders, bounds
+                WHERE created_at >= GREATEST(bounds.full_to, bounds.full_from) AND created_at <= $2
             )
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-            RETURNING *
+            SELECT
+                COALESCE(SUM(total_orders), 0)::BIGINT as total_orders,
+                COALESCE(SUM(completed_orders), 0)::BIGINT as completed_orders,
+                COALESCE(SUM(total_turnover_usd), 0) as total_turnover_usd,
+                COALESCE(SUM(total_commission_usd), 0) as total_commission_usd,
+                COALESCE(SUM(total_turnover_rub), 0) as total_turnover_rub
+            FROM parts
+        """,
+        "orders.get_paid_user_orders": f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            WHERE status = 'PAID_USER'
+            ORDER BY paid_at DESC
+        """,
+    }
+
+    # Admin-only statements, prepared on first use
+    LAZY_STATEMENTS = frozenset({
+        *_keyset_statements("all_orders_page", "", 0),
+        *_keyset_statements("status_orders_page", "status = $1", 1),
+        "orders.get_stats",
+        "orders.get_paid_user_orders",
+    })
+
+    def __init__(self, db, recent: Optional[TTLCache] = None):
+        self.db = db
+        db.register_many(self.STATEMENTS, lazy=self.LAZY_STATEMENTS)
+        # Orders created by this process by idempotency key
+        self.recent = recent if recent is not None else TTLCache(maxsize=10000, ttl=600.0)
+        # user_id -> (lock, tasks holding or waiting for it)
+        self._create_locks: Dict[int, Tuple[asyncio.Lock, int]] = {}
+
+    async def create(self, order: Order) -> Tuple[Order, bool]:
+        """Create new order; returns (order, created).
+
+        An order with an ``idempotency_key`` is created once: repeating
+        the call returns the order created first with created=False.
+        Calls for one user run one at a time, so in-process repeats are
+        answered from memory; the unique index catches repeats coming
+        through other processes.
+
+        Raises ActiveOrderExistsError if the user already has another
+        active order (enforced by a unique partial index, so concurrent
+        requests cannot both succeed).
         """
-        record = await self.db.fetchrow(
-            query,
+        key = order.idempotency_key
+        if key is None:
+            return await self._insert(order), True
+
+        async with self._user_lock(order.user_id):
+            existing = self.recent.get(key)
+            if existing is not None:
+                return existing, False
+
+            try:
+                created = await self._insert(order)
+            except ActiveOrderExistsError:
+                record = await self.db.fetchrow_named("orders.get_by_idempotency_key", key)
+                if record is None:
+                    raise
+                existing = Order.from_record(record)
+                self.recent.set(key, existing)
+                return existing, False
+
+            self.recent.set(key, created)
+            return created, True
+
+    @asynccontextmanager
+    async def _user_lock(self, user_id: int) -> AsyncIterator[None]:
+        """Hold per-user creation lock, dropping it once nobody uses it."""
+        lock, users = self._create_locks.get(user_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._create_locks[user_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._create_locks[user_id]
+            if users == 1:
+                del self._create_locks[user_id]
+            else:
+                self._create_locks[user_id] = (lock, users - 1)
+
+    async def _insert(self, order: Order) -> Order:
+        """Insert order, raising ActiveOrderExistsError if any unique index conflicts."""
+        record = await self.db.fetchrow_named(
+            "orders.create",
             order.user_id,
             order.service_name,
             order.base_amount,
@@ -109,71 +345,100 @@ class OrderRepository:
             order.payment_method,
             order.payment_amount,
             order.payment_currency,
-            order.status
+            order.status,
+            order.exchange_rate,
+            order.idempotency_key
         )
+        if record is None:
+            raise ActiveOrderExistsError(order.user_id)
         return Order.from_record(record)
 
     async def get(self, order_id: int) -> Optional[Order]:
         """Get order by ID."""
-        query = "SELECT * FROM orders WHERE id = $1"
-        record = await self.db.fetchrow(query, order_id)
+        record = await self.db.fetchrow_named("orders.get", order_id)
         return Order.from_record(record) if record else None
 
+    async def _get_page(
+        self,
+        statement: str,
+        args: tuple,
+        limit: int,
+        cursor: Optional[Cursor],
+        newer: bool
+    ) -> OrderPage:
+        """Fetch keyset page; one extra row tells whether the page has a neighbour."""
+        if cursor is None:
+            records = await self.db.fetch_named(statement, *args, limit + 1)
+            orders = [Order.from_record(record) for record in records]
+            has_older = len(orders) > limit
+            orders = orders[:limit]
+            return OrderPage(orders, next_cursor=orders[-1].cursor if has_older else None)
+
+        if newer:
+            records = await self.db.fetch_named(f"{statement}_newer", *args, *cursor, limit + 1)
+            orders = [Order.from_record(record) for record in records]
+            if not orders:
+                # Everything newer is gone, start over from the first page
+                return await self._get_page(statement, args, limit, None, False)
+            has_newer = len(orders) > limit
+            orders = orders[:limit]
+            orders.reverse()
+            return OrderPage(
+                orders,
+                next_cursor=orders[-1].cursor,
+                prev_cursor=orders[0].cursor if has_newer else None
+            )
+
+        records = await self.db.fetch_named(f"{statement}_older", *args, *cursor, limit + 1)
+        orders = [Order.from_record(record) for record in records]
+        has_older = len(orders) > limit
+        orders = orders[:limit]
+        return OrderPage(
+            orders,
+            next_cursor=orders[-1].cursor if has_older else None,
+            prev_cursor=orders[0].cursor if orders else None
+        )
+
     async def get_user_orders(
         self,
         user_id: int,
         limit: int = 10,
-        offset: int = 0
-    ) -> List[Order]:
-        """Get user orders."""
-        query = """
-            SELECT * FROM orders
-            WHERE user_id = $1
-            ORDER BY created_at DESC
-            LIMIT $2 OFFSET $3
-        """
-        records = await self.db.fetch(query, user_id, limit, offset)
-        return [Order.from_record(record) for record in records]
+        cursor: Optional[Cursor] = None,
+        newer: bool = False
+    ) -> OrderPage:
+        """Get page of user orders before (or, with newer=True, after) cursor."""
+        return await self._get_page("orders.user_orders_page", (user_id,), limit, cursor, newer)
 
     async def get_active_order(self, user_id: int) -> Optional[Order]:
         """Get user's active order (PENDING or PAID_USER status)."""
-        query = """
-            SELECT * FROM orders
-            WHERE user_id = $1 AND status IN ('PENDING', 'PAID_USER')
-            ORDER BY created_at DESC
-            LIMIT 1
-        """
-        record = await self.db.fetchrow(query, user_id)
+        record = await self.db.fetchrow_named("orders.get_active_order", user_id)
         return Order.from_record(record) if record else None
 
-    async def update_status(
+    async def transition(
         self,
         order_id: int,
         status: str,
         paid_at: Optional[datetime] = None,
-        completed_at: Optional[datetime] = None
-    ):
-        """Update order status."""
-        query = """
-            UPDATE orders
-            SET status = $1, paid_at = COALESCE($2, paid_at),
-                completed_at = COALESCE($3, completed_at)
-            WHERE id = $4
+        completed_at: Optional[datetime] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[Tuple[Order, Optional[str]]]:
+        """Move order to status if ALLOWED_TRANSITIONS permits it from the current one.
+
+        Returns updated order and its owner's language, or None when the
+        order doesn't exist (or doesn't belong to ``user_id``, if given) or
+        its current status doesn't allow the change.
         """
-        await self.db.execute(query, status, paid_at, completed_at, order_id)
+        sources = [current for current, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+        record = await self.db.fetchrow_named(
+            "orders.transition", order_id, status, paid_at, completed_at, sources, user_id
+        )
+        if record is None:
+            return None
+        return Order(*record[:-1]), record[-1]
 
     async def get_user_stats(self, user_id: int) -> dict:
         """Get user statistics."""
-        query = """
-            SELECT
-                COUNT(*) FILTER (WHERE status = 'COMPLETED') as completed_count,
-                COALESCE(SUM(total_amount) FILTER (WHERE status = 'COMPLETED'), 0) as total_spent,
-                MIN(created_at) FILTER (WHERE status = 'COMPLETED') as first_payment,
-                MAX(created_at) FILTER (WHERE status = 'COMPLETED') as last_payment
-            FROM orders
-            WHERE user_id = $1
-        """
-        record = await self.db.fetchrow(query, user_id)
+        record = await self.db.fetchrow_named("orders.get_user_stats", user_id)
         return {
             "completed_count": record["completed_count"] or 0,
             "total_spent": float(record["total_spent"]) or 0.0,
@@ -184,45 +449,22 @@ class OrderRepository:
     async def get_all_orders(
         self,
         status: Optional[str] = None,
-        limit: int = 50,
-        offset: int = 0
-    ) -> List[Order]:
-        """Get all orders with optional status filter."""
+        limit: int = 10,
+        cursor: Optional[Cursor] = None,
+        newer: bool = False
+    ) -> OrderPage:
+        """Get page of all orders with optional status filter."""
         if status:
-            query = """
-                SELECT * FROM orders
-                WHERE status = $1
-                ORDER BY created_at DESC
-                LIMIT $2 OFFSET $3
-            """
-            records = await self.db.fetch(query, status, limit, offset)
-        else:
-            query = """
-                SELECT * FROM orders
-                ORDER BY created_at DESC
-                LIMIT $1 OFFSET $2
-            """
-            records = await self.db.fetch(query, limit, offset)
-
-        return [Order.from_record(record) for record in records]
+            return await self._get_page("orders.status_orders_page", (status,), limit, cursor, newer)
+        return await self._get_page("orders.all_orders_page", (), limit, cursor, newer)
 
     async def get_stats(
         self,
         start_date: datetime,
         end_date: datetime
     ) -> dict:
-        """Get statistics for period."""
-        query = """
-            SELECT
-                COUNT(*) as total_orders,
-                COUNT(*) FILTER (WHERE status = 'COMPLETED') as completed_orders,
-                COALESCE(SUM(total_amount), 0) as total_turnover_usd,
-                COALESCE(SUM(commission_amount), 0) as total_commission_usd,
-                COALESCE(SUM(payment_amount) FILTER (WHERE payment_currency = 'RUB'), 0) as total_turnover_rub
-            FROM orders
-            WHERE created_at >= $1 AND created_at <= $2
-        """
-        record = await self.db.fetchrow(query, start_date, end_date)
+        """Get statistics for period in O(hours) using the hourly rollup."""
+        record = await self.db.fetchrow_named("orders.get_stats", start_date, end_date)
         total = record["total_orders"] or 0
         completed = record["completed_orders"] or 0
 
@@ -237,10 +479,5 @@ class OrderRepository:
 
     async def get_paid_user_orders(self) -> List[Order]:
         """Get orders with PAID_USER status for admin review."""
-        query = """
-            SELECT * FROM orders
-            WHERE status = 'PAID_USER'
-            ORDER BY paid_at DESC
-        """
-        records = await self.db.fetch(query)
+        records = await self.db.fetch_named("orders.get_paid_user_orders")
         return [Order.from_record(record) for record in records]
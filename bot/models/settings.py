@@ -1,17 +1,114 @@
 """Settings model and database operations."""
-from typing import Optional
+import asyncio
+import logging
+from typing import Optional, Dict, Tuple
+
+import asyncpg
+
+from bot.utils.commission import COMMISSION_TIERS_KEY, DEFAULT_SCHEDULE, CommissionSchedule
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel fired by the settings table trigger (see migrations/0001_initial.sql)
+SETTINGS_CHANNEL = "settings_changed"
 
 
 class SettingsRepository:
-    """Settings database operations."""
+    """Settings database operations.
+
+    All reads are served from an in-memory snapshot of the settings table.
+    The snapshot is loaded at startup and reloaded whenever the settings
+    trigger sends a NOTIFY, so every bot instance sees changes without polling.
+    """
 
-    def __init__(self, db):
+    def __init__(self, db, channel: str = SETTINGS_CHANNEL, reconnect_delay: float = 5.0):
         self.db = db
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._snapshot: Dict[str, str] = {}
+        self._loaded = False
+        self._listener: Optional[asyncpg.Connection] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_again = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # (raw setting value, parsed schedule), reparsed only when the value changes
+        self._commission: Tuple[Optional[str], CommissionSchedule] = (None, DEFAULT_SCHEDULE)
+
+    async def load(self):
+        """Load settings snapshot from the database."""
+        query = "SELECT key, value FROM settings"
+        records = await self.db.fetch(query)
+        self._snapshot = {record["key"]: record["value"] for record in records}
+        self._loaded = True
+
+    async def start_listener(self):
+        """Subscribe to settings changes and keep the snapshot fresh."""
+        self._listener = await self.db.listen(
+            self.channel,
+            self._on_notify,
+            on_terminate=self._on_listener_lost
+        )
+
+    async def close(self):
+        """Stop listening for settings changes."""
+        self._closed = True
+        for task in (self._refresh_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        await self._close_listener()
+
+    async def _close_listener(self):
+        """Close listener connection without treating it as lost."""
+        listener, self._listener = self._listener, None
+        if listener and not listener.is_closed():
+            listener.remove_termination_listener(self._on_listener_lost)
+            await listener.close()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Schedule snapshot reload, coalescing notification bursts."""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_again = True
+            return
+        self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self):
+        """Reload snapshot until no notifications arrived during the reload."""
+        while True:
+            self._refresh_again = False
+            try:
+                await self.load()
+                logger.info("Settings snapshot reloaded")
+            except Exception as e:
+                logger.error(f"Failed to reload settings: {e}")
+            if not self._refresh_again:
+                return
+
+    def _on_listener_lost(self, connection):
+        """Reconnect listener after the dedicated connection dropped."""
+        if self._closed:
+            return
+        logger.warning("Settings listener connection lost, reconnecting")
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Re-subscribe and reload, since notifications may have been missed."""
+        while not self._closed:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start_listener()
+                await self.load()
+                return
+            except Exception as e:
+                logger.error(f"Failed to reconnect settings listener: {e}")
+                # Drop the listener if only load() failed, the next attempt opens a new one
+                await self._close_listener()
 
     async def get(self, key: str) -> Optional[str]:
         """Get setting value by key."""
-        query = "SELECT value FROM settings WHERE key = $1"
-        return await self.db.fetchval(query, key)
+        if not self._loaded:
+            await self.load()
+        return self._snapshot.get(key)
 
     async def set(self, key: str, value: str):
         """Set setting value."""
@@ -22,6 +119,8 @@ class SettingsRepository:
             SET value = EXCLUDED.value
         """
         await self.db.execute(query, key, value)
+        # Snapshot is replaced, never mutated, so readers holding it are safe
+        self._snapshot = {**self._snapshot, key: value}
 
     async def get_payment_requisites(self, payment_method: str) -> str:
         """Get payment requisites by method."""
@@ -47,8 +146,24 @@ class SettingsRepository:
         key = f"instruction_text_{language}"
         await self.set(key, text)
 
+    async def get_commission_schedule(self) -> CommissionSchedule:
+        """Get commission tiers from settings, or the default ones if not set or invalid."""
+        value = await self.get(COMMISSION_TIERS_KEY)
+        raw, schedule = self._commission
+        if value == raw:
+            return schedule
+
+        schedule = DEFAULT_SCHEDULE
+        if value:
+            try:
+                schedule = CommissionSchedule.from_json(value)
+            except ValueError as e:
+                logger.error(f"Using default commission tiers: {e}")
+        self._commission = (value, schedule)
+        return schedule
+
     async def get_all_settings(self) -> dict:
-        """Get all settings."""
-        query = "SELECT key, value FROM settings"
-        records = await self.db.fetch(query)
-        return {record["key"]: record["value"] for record in records}
+        """Get all settings (read-only snapshot, do not mutate)."""
+        if not self._loaded:
+            await self.load()
+        return self._snapshot
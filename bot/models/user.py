@@ -1,11 +1,30 @@
 """User model and database operations."""
+import asyncio
+import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
 import asyncpg
 
+from bot.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel fired by the users trigger on language/block changes
+# (see migrations/0004_user_changed_notify.sql); payload is the telegram id
+USERS_CHANNEL = "user_changed"
+
 
 class User:
-    """User model."""
+    """User model.
+
+    Slotted; ``from_record`` maps columns by position, so every query
+    feeding it must select USER_COLUMNS in this order.
+    """
+
+    __slots__ = (
+        "telegram_id", "username", "first_name", "language", "is_blocked",
+        "created_at", "updated_at"
+    )
 
     def __init__(
         self,
@@ -27,16 +46,8 @@ class User:
 
     @classmethod
     def from_record(cls, record: asyncpg.Record) -> "User":
-        """Create User instance from database record."""
-        return cls(
-            telegram_id=record["telegram_id"],
-            username=record["username"],
-            first_name=record["first_name"],
-            language=record["language"],
-            is_blocked=record["is_blocked"],
-            created_at=record["created_at"],
-            updated_at=record["updated_at"]
-        )
+        """Create User instance from record selecting USER_COLUMNS."""
+        return cls(*record)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert user to dictionary."""
@@ -51,11 +62,119 @@ class User:
         }
 
 
+# Column list matching User.__slots__ for SELECT/RETURNING
+USER_COLUMNS = ", ".join(User.__slots__)
+
+
 class UserRepository:
-    """User database operations."""
+    """User database operations.
+
+    Users are served from an in-process cache. The users trigger sends a
+    NOTIFY whenever a user's language or block flag changes (from any
+    instance or directly in SQL), on which the user is dropped from the
+    cache; while the listener connection is down the cache is bypassed.
+    """
+
+    STATEMENTS = {
+        "users.get": f"SELECT {USER_COLUMNS} FROM users WHERE telegram_id = $1",
+        "users.get_or_create": f"""
+            INSERT INTO users (telegram_id, username, first_name)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (telegram_id) DO UPDATE
+            SET username = EXCLUDED.username,
+                first_name = EXCLUDED.first_name
+            RETURNING {USER_COLUMNS}
+        """,
+        "users.flush_profiles": """
+            INSERT INTO users (telegram_id, username, first_name)
+            SELECT * FROM unnest($1::bigint[], $2::varchar[], $3::varchar[])
+            ON CONFLICT (telegram_id) DO UPDATE
+            SET username = EXCLUDED.username,
+                first_name = EXCLUDED.first_name
+            WHERE users.username IS DISTINCT FROM EXCLUDED.username
+               OR users.first_name IS DISTINCT FROM EXCLUDED.first_name
+        """,
+        "users.update_language": f"UPDATE users SET language = $1 WHERE telegram_id = $2 RETURNING {USER_COLUMNS}",
+        "users.block": f"UPDATE users SET is_blocked = TRUE WHERE telegram_id = $1 RETURNING {USER_COLUMNS}",
+        "users.unblock": f"UPDATE users SET is_blocked = FALSE WHERE telegram_id = $1 RETURNING {USER_COLUMNS}",
+        "users.count": "SELECT COUNT(*) FROM users",
+        "users.iter_active": """
+            SELECT telegram_id, username, first_name, language
+            FROM users
+            WHERE NOT is_blocked
+        """,
+    }
+
+    # Admin and broadcast statements, prepared on first use
+    LAZY_STATEMENTS = frozenset({
+        "users.block",
+        "users.unblock",
+        "users.count",
+        "users.iter_active",
+    })
 
-    def __init__(self, db):
+    def __init__(
+        self,
+        db,
+        cache: Optional[TTLCache] = None,
+        flush_interval: float = 0.5,
+        channel: str = USERS_CHANNEL,
+        reconnect_delay: float = 5.0
+    ):
         self.db = db
+        db.register_many(self.STATEMENTS, lazy=self.LAZY_STATEMENTS)
+        self.cache = cache if cache is not None else TTLCache()
+        self.flush_interval = flush_interval
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._pending: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Bumped on every invalidation, so a read racing one is not cached
+        self.invalidations = 0
+        self._listener: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start_listener(self):
+        """Subscribe to user changes, dropping changed users from the cache."""
+        self._listener = await self.db.listen(self.channel, self._on_notify, on_terminate=self._on_listener_lost)
+
+    async def _close_listener(self):
+        """Close listener connection without treating it as lost."""
+        listener, self._listener = self._listener, None
+        if listener and not listener.is_closed():
+            listener.remove_termination_listener(self._on_listener_lost)
+            await listener.close()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Drop changed user from the cache."""
+        self.invalidations += 1
+        self.cache.pop(int(payload))
+
+    def _on_listener_lost(self, connection):
+        """Stop trusting the cache until the listener is back."""
+        self._listener = None
+        self.invalidations += 1
+        self.cache.clear()
+        if self._closed:
+            return
+        logger.warning("Users listener connection lost, reading users from the database until reconnected")
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Re-subscribe; changes missed meanwhile are covered by clearing the cache."""
+        while not self._closed:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start_listener()
+            except Exception as e:
+                logger.error(f"Failed to reconnect users listener: {e}")
+                continue
+            self.invalidations += 1
+            self.cache.clear()
+            logger.info("Users listener reconnected")
+            return
 
     async def get_or_create(
         self,
@@ -63,46 +182,142 @@ class UserRepository:
         username: Optional[str] = None,
         first_name: Optional[str] = None
     ) -> User:
-        """Get existing user or create new one."""
-        query = """
-            INSERT INTO users (telegram_id, username, first_name)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (telegram_id) DO UPDATE
-            SET username = EXCLUDED.username,
-                first_name = EXCLUDED.first_name
-            RETURNING *
+        """Get existing user or create new one.
+
+        Served from the cache when the profile is unchanged. New users are
+        inserted immediately; username/first_name changes of known users are
+        queued and written by the background flusher.
         """
-        record = await self.db.fetchrow(query, telegram_id, username, first_name)
-        return User.from_record(record)
+        user = self.cache.get(telegram_id) if self._listener is not None else None
+        if user is None:
+            user = await self.get(telegram_id)
+
+        if user is None:
+            record = await self.db.fetchrow_named(
+                "users.get_or_create", telegram_id, username, first_name
+            )
+            user = self._remember(record)
+        elif user.username != username or user.first_name != first_name:
+            user.username = username
+            user.first_name = first_name
+            self._pending[telegram_id] = (username, first_name)
+
+        return user
 
     async def get(self, telegram_id: int) -> Optional[User]:
         """Get user by telegram_id."""
-        query = "SELECT * FROM users WHERE telegram_id = $1"
-        record = await self.db.fetchrow(query, telegram_id)
-        return User.from_record(record) if record else None
+        invalidations = self.invalidations
+        record = await self.db.fetchrow_named("users.get", telegram_id)
+        # The record may predate a change announced while we were waiting for it
+        return self._remember(record, cache=invalidations == self.invalidations) if record else None
+
+    def _remember(self, record: asyncpg.Record, cache: bool = True) -> User:
+        """Build User from record, overlay queued profile changes and cache it."""
+        user = User.from_record(record)
+        pending = self._pending.get(user.telegram_id)
+        if pending:
+            user.username, user.first_name = pending
+        if cache and self._listener is not None:
+            self.cache.set(user.telegram_id, user)
+        return user
+
+    async def _update(self, statement: str, *args):
+        """Run user UPDATE ... RETURNING statement and refresh cached copy."""
+        record = await self.db.fetchrow_named(statement, *args)
+        if record:
+            self._remember(record)
+        return record
 
     async def update_language(self, telegram_id: int, language: str):
         """Update user language."""
-        query = "UPDATE users SET language = $1 WHERE telegram_id = $2"
-        await self.db.execute(query, language, telegram_id)
+        await self._update("users.update_language", language, telegram_id)
 
     async def block_user(self, telegram_id: int):
         """Block user."""
-        query = "UPDATE users SET is_blocked = TRUE WHERE telegram_id = $1"
-        await self.db.execute(query, telegram_id)
+        await self._update("users.block", telegram_id)
 
     async def unblock_user(self, telegram_id: int):
         """Unblock user."""
-        query = "UPDATE users SET is_blocked = FALSE WHERE telegram_id = $1"
-        await self.db.execute(query, telegram_id)
+        await self._update("users.unblock", telegram_id)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get user cache hit/miss/invalidation counters."""
+        return {
+            **self.cache.stats(),
+            "invalidations": self.invalidations,
+            "pending_writes": len(self._pending)
+        }
+
+    async def flush(self) -> int:
+        """Write queued profile changes in a single statement.
+
+        Returns number of flushed users. On failure the changes are queued
+        again (unless superseded by newer ones) and the error is re-raised.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+            try:
+                await self.db.execute_named(
+                    "users.flush_profiles",
+                    list(pending.keys()),
+                    [username for username, _ in pending.values()],
+                    [first_name for _, first_name in pending.values()]
+                )
+            except Exception:
+                for telegram_id, profile in pending.items():
+                    self._pending.setdefault(telegram_id, profile)
+                raise
+
+            return len(pending)
+
+    async def _flush_loop(self):
+        """Periodically flush queued profile changes."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush user profiles: {e}")
+
+    def start_flusher(self):
+        """Start background flusher of queued profile changes."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self, attempts: int = 3):
+        """Stop listening and the background flusher, write everything still queued."""
+        self._closed = True
+        if self._reconnect_task and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+        await self._close_listener()
+
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        for attempt in range(1, attempts + 1):
+            try:
+                flushed = await self.flush()
+                if flushed:
+                    logger.info(f"Flushed {flushed} pending user profiles")
+                return
+            except Exception as e:
+                logger.error(f"Final user profile flush failed (attempt {attempt}): {e}")
+                await asyncio.sleep(attempt)
+
+        logger.error(f"Lost {len(self._pending)} pending user profile updates")
 
-    async def get_all_users(self) -> list[User]:
-        """Get all users."""
-        query = "SELECT * FROM users ORDER BY created_at DESC"
-        records = await self.db.fetch(query)
-        return [User.from_record(record) for record in records]
+    def iter_active_users(self, prefetch: int = 1000) -> AsyncIterator[asyncpg.Record]:
+        """Stream not blocked users (telegram_id, username, first_name, language)."""
+        return self.db.iterate_named("users.iter_active", prefetch=prefetch)
 
     async def count_all_users(self) -> int:
         """Count all users."""
-        query = "SELECT COUNT(*) FROM users"
-        return await self.db.fetchval(query)
+        return await self.db.fetchval_named("users.count")
@@ -0,0 +1,205 @@
+"""Background broadcast delivery."""
+import asyncio
+import logging
+import secrets
+import time
+from typing import Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+
+from bot.models.broadcast import Broadcast, BroadcastRepository, DeliveryStatus
+from bot.utils.rate_limit import TokenBucket
+from bot.utils.texts import get_text
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """Sends broadcasts in the background.
+
+    Delivery is limited by a global token bucket (Telegram allows ~30 messages
+    per second) and a concurrency limit, honours RetryAfter and stores the
+    result per recipient, so unfinished broadcasts resume after a restart.
+    Results are stored per batch: recipients of a batch interrupted by a
+    crash or shutdown get the message again on resume (at-least-once).
+    Database errors restart delivery from the pending recipients after a
+    backoff instead of stalling until the next restart. The lease is
+    renewed before every batch; once another instance has claimed the
+    broadcast (the lease expired meanwhile), delivery stops.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        repo: BroadcastRepository,
+        rate: float = 25.0,
+        concurrency: int = 10,
+        batch_size: int = 100,
+        max_attempts: int = 3,
+        progress_interval: float = 5.0,
+        lease: float = 300.0,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0
+    ):
+        self.bot = bot
+        self.repo = repo
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.progress_interval = progress_interval
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Lease owner token of this engine
+        self.owner = secrets.token_hex(8)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(self, broadcast: Broadcast) -> Broadcast:
+        """Create broadcast and start delivering it."""
+        broadcast = await self.repo.create(broadcast, self.lease, self.owner)
+        self._spawn(broadcast)
+        return broadcast
+
+    async def resume(self):
+        """Resume broadcasts interrupted by a restart."""
+        for broadcast in await self.repo.claim_stale(self.lease, self.owner):
+            logger.info(f"Resuming broadcast #{broadcast.id}")
+            self._spawn(broadcast)
+
+    async def close(self):
+        """Stop delivery; unsent recipients stay pending for resume()."""
+        running = dict(self._tasks)
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+
+        for broadcast_id in running:
+            try:
+                await self.repo.release_lease(broadcast_id, self.owner)
+            except Exception as e:
+                logger.error(f"Failed to release broadcast #{broadcast_id}: {e}")
+
+    def _spawn(self, broadcast: Broadcast):
+        """Run broadcast in a background task."""
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast.id, None))
+
+    async def _run(self, broadcast: Broadcast):
+        """Deliver broadcast, retrying with backoff after unexpected errors."""
+        failures = 0
+        while True:
+            try:
+                await self._deliver_all(broadcast)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(self.retry_delay * 2 ** min(failures - 1, 16), self.max_retry_delay)
+                logger.error(f"Broadcast #{broadcast.id} failed: {e}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+    async def _deliver_all(self, broadcast: Broadcast):
+        """Deliver broadcast batch by batch to recipients still pending."""
+        counts = await self.repo.get_counts(broadcast.id)
+        reported_at = time.monotonic()
+        last_user_id = 0
+
+        while True:
+            # A retry after an outage or a long RetryAfter may outlast the lease
+            if not await self.repo.renew_lease(broadcast.id, self.lease, self.owner):
+                logger.warning(f"Broadcast #{broadcast.id} was taken over by another instance, stopping")
+                return
+
+            user_ids = await self.repo.get_pending(broadcast.id, last_user_id, self.batch_size)
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+
+            results = await asyncio.gather(
+                *(self._deliver(user_id, broadcast.text) for user_id in user_ids)
+            )
+            statuses = [status for status, _ in results]
+            await self.repo.save_results(
+                broadcast.id,
+                user_ids,
+                statuses,
+                [error for _, error in results]
+            )
+
+            counts[DeliveryStatus.PENDING] -= len(user_ids)
+            counts[DeliveryStatus.SENT] += statuses.count(DeliveryStatus.SENT)
+            counts[DeliveryStatus.FAILED] += statuses.count(DeliveryStatus.FAILED)
+
+            if time.monotonic() - reported_at >= self.progress_interval:
+                reported_at = time.monotonic()
+                await self._report(
+                    broadcast,
+                    get_text(
+                        broadcast.language,
+                        "broadcast_progress",
+                        sent=counts[DeliveryStatus.SENT],
+                        failed=counts[DeliveryStatus.FAILED],
+                        total=sum(counts.values())
+                    )
+                )
+
+        await self.repo.finish(broadcast.id)
+        logger.info(f"Broadcast #{broadcast.id} finished: {counts}")
+        await self._report(
+            broadcast,
+            get_text(broadcast.language, "broadcast_sent", count=counts[DeliveryStatus.SENT])
+        )
+
+    async def _deliver(self, user_id: int, text: str) -> Tuple[str, Optional[str]]:
+        """Send message to one recipient, returning (status, error)."""
+        error = None
+        attempt = 0
+        async with self._semaphore:
+            while attempt < self.max_attempts:
+                await self.bucket.acquire()
+                try:
+                    await self.bot.send_message(user_id, text)
+                    return DeliveryStatus.SENT, None
+                except TelegramRetryAfter as e:
+                    # Flood control applies to the whole bot, stop every sender;
+                    # not the recipient's fault, so not counted as an attempt
+                    self.bucket.pause(e.retry_after)
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # Bot blocked by the user, chat not found, etc.; retry won't help
+                    return DeliveryStatus.FAILED, str(e)
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    error = str(e)
+                    await asyncio.sleep(2 ** attempt)
+                    attempt += 1
+                except Exception as e:
+                    # Unexpected error fails this recipient, not the whole batch
+                    logger.exception(f"Failed to deliver broadcast to {user_id}")
+                    return DeliveryStatus.FAILED, f"{type(e).__name__}: {e}"
+
+        return DeliveryStatus.FAILED, error
+
+    async def _report(self, broadcast: Broadcast, text: str):
+        """Edit the admin's progress message."""
+        if not broadcast.progress_chat_id:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=broadcast.progress_chat_id,
+                message_id=broadcast.progress_message_id
+            )
+        except TelegramRetryAfter as e:
+            self.bucket.pause(e.retry_after)
+        except (TelegramBadRequest, TelegramNetworkError, TelegramServerError) as e:
+            logger.warning(f"Failed to report broadcast #{broadcast.id} progress: {e}")
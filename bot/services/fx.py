@@ -0,0 +1,195 @@
+"""USD to RUB exchange rate kept fresh in the background."""
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from typing import Any, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Settings key read by SettingsRateSource
+RATE_SETTING_KEY = "usd_to_rub_rate"
+
+# Precision of orders.exchange_rate (DECIMAL(12, 4)); the rate applied is the one stored
+RATE_QUANTUM = Decimal("0.0001")
+RATE_LIMIT = Decimal(10) ** 8
+
+
+def parse_rate(value: Any) -> Decimal:
+    """Convert source value to a positive Decimal rate with 4 decimal places."""
+    try:
+        rate = Decimal(str(value).strip())
+        if not rate.is_finite():
+            raise InvalidOperation
+        rate = rate.quantize(RATE_QUANTUM, rounding=ROUND_HALF_EVEN)
+    except InvalidOperation:
+        raise ValueError(f"Invalid exchange rate: {value!r}") from None
+    if rate <= 0 or rate >= RATE_LIMIT:
+        raise ValueError(f"Invalid exchange rate: {value!r}")
+    return rate
+
+
+def _field(data: Any, path: str) -> Any:
+    """Get value by dotted path ("rates.RUB") from parsed JSON."""
+    for name in path.split("."):
+        data = data[name]
+    return data
+
+
+class RateSource(ABC):
+    """Where the rate comes from."""
+
+    @abstractmethod
+    async def fetch(self) -> Decimal:
+        """Get the current rate (see parse_rate); raises on any failure."""
+
+    async def close(self):
+        """Release resources."""
+
+
+class SettingsRateSource(RateSource):
+    """Rate from the settings table (changed by admins without restart)."""
+
+    def __init__(self, settings_repo, key: str = RATE_SETTING_KEY):
+        self.settings_repo = settings_repo
+        self.key = key
+
+    async def fetch(self) -> Decimal:
+        value = await self.settings_repo.get(self.key)
+        if value is None:
+            raise LookupError(f"Setting {self.key!r} is not set")
+        return parse_rate(value)
+
+
+class FileRateSource(RateSource):
+    """Rate from a local JSON file, e.g. {"usd_to_rub": "95.50"}."""
+
+    def __init__(self, path: str, field: str = "usd_to_rub"):
+        self.path = path
+        self.field = field
+
+    def _read(self) -> Any:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def fetch(self) -> Decimal:
+        data = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        return parse_rate(_field(data, self.field))
+
+
+class HttpRateSource(RateSource):
+    """Rate from a JSON HTTP endpoint."""
+
+    def __init__(self, url: str, field: str = "usd_to_rub", timeout: float = 10.0):
+        self.url = url
+        self.field = field
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def fetch(self) -> Decimal:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        async with self._session.get(self.url) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return parse_rate(_field(data, self.field))
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+
+class RateProvider:
+    """Serves the current USD to RUB rate from memory.
+
+    ``rate`` is a plain attribute, so readers (the payment flow) never
+    wait; a background task replaces it every ``interval`` seconds. On
+    fetch errors the last good rate (initially the configured one) stays
+    in use; once it is older than ``max_age`` seconds every failed
+    refresh is logged as an error, and ``age`` is exported as a metric.
+    """
+
+    def __init__(
+        self,
+        initial_rate: Decimal,
+        source: Optional[RateSource] = None,
+        interval: float = 300.0,
+        max_age: float = 3600.0
+    ):
+        self.rate = parse_rate(initial_rate)
+        self.source = source
+        self.interval = interval
+        # 0 = never stale
+        self.max_age = max_age
+        self.started_at = time.monotonic()
+        # Monotonic time of the last successful fetch (None = still the initial rate)
+        self.updated_at: Optional[float] = None
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the rate was fetched (or since start, for the initial one); None without a source."""
+        if self.source is None:
+            return None
+        return time.monotonic() - (self.updated_at or self.started_at)
+
+    @property
+    def stale(self) -> bool:
+        """Whether the rate in use is older than max_age."""
+        age = self.age
+        return age is not None and self.max_age > 0 and age > self.max_age
+
+    async def refresh(self) -> bool:
+        """Fetch rate from the source; returns whether it succeeded."""
+        if self.source is None:
+            return False
+        try:
+            rate = await self.source.fetch()
+        except Exception as e:
+            self.failures += 1
+            age = f"{self.age:.0f}s old" if self.updated_at else "initial"
+            if self.stale:
+                logger.error(
+                    f"Exchange rate is stale: failed to refresh, payments still use {self.rate} "
+                    f"({age}, max age {self.max_age:.0f}s): {e}"
+                )
+            else:
+                logger.warning(f"Failed to refresh exchange rate, keeping {self.rate} ({age}): {e}")
+            return False
+
+        if rate != self.rate:
+            logger.info(f"Exchange rate updated: {self.rate} -> {rate}")
+        self.rate = rate
+        self.updated_at = time.monotonic()
+        return True
+
+    async def _refresh_loop(self):
+        """Periodically refresh the rate."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    async def start(self):
+        """Fetch the rate once and keep refreshing it in the background."""
+        if self.source is None or self._task is not None:
+            return
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        """Stop refreshing."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.source:
+            await self.source.close()
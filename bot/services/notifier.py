@@ -0,0 +1,173 @@
+"""Background notifications to the admin chat."""
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from bot.utils.rate_limit import TokenBucket
+from bot.utils.texts import get_text
+
+logger = logging.getLogger(__name__)
+
+# Telegram message length limit
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+# Order buttons per digest keyboard row
+DIGEST_BUTTONS_PER_ROW = 4
+
+# (text, order_id, reply_markup)
+Notification = Tuple[str, Optional[int], Optional[InlineKeyboardMarkup]]
+
+
+class AdminNotifier:
+    """Delivers admin chat notifications in the background.
+
+    Handlers only enqueue. Messages go out no faster than the chat's rate
+    limit; notifications that pile up meanwhile are sent as one digest
+    whose buttons open the mentioned orders. RetryAfter is honoured and
+    network/server errors are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        rate: float = 0.3,
+        language: str = "ru",
+        max_batch: int = 50,
+        max_attempts: int = 5,
+        queue_size: int = 1000
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.language = language
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        # Groups allow about 20 messages per minute
+        self.bucket = TokenBucket(rate, capacity=1)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(
+        self,
+        text: str,
+        order_id: Optional[int] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ):
+        """Queue notification; never waits for Telegram."""
+        if not self.chat_id:
+            return
+        try:
+            self._queue.put_nowait((text, order_id, reply_markup))
+        except asyncio.QueueFull:
+            logger.error(f"Admin notification queue is full, dropped: {text[:100]!r}")
+
+    def start(self):
+        """Start background delivery."""
+        if self._task is None and self.chat_id:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10.0):
+        """Deliver what is queued (up to timeout) and stop."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Dropped {self._queue.qsize()} admin notifications on shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        """Send queued notifications, coalescing those that waited for the rate limit."""
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await self.bucket.acquire()
+                while len(batch) < self.max_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                if len(batch) == 1:
+                    text, _, reply_markup = batch[0]
+                    await self._send(text, reply_markup)
+                else:
+                    for index, (text, reply_markup) in enumerate(self._digests(batch)):
+                        if index:
+                            await self.bucket.acquire()
+                        await self._send(text, reply_markup)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to deliver admin notifications: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _digests(self, batch: List[Notification]) -> List[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+        """Pack notifications into as few digest messages as fit the length limit."""
+        digests = []
+        chunk: List[Notification] = []
+        length = 0
+        for notification in batch:
+            # Leave room for the header
+            added = len(notification[0]) + len(DIGEST_SEPARATOR)
+            if chunk and length + added > MAX_MESSAGE_LENGTH - 100:
+                digests.append(self._digest(chunk))
+                chunk, length = [], 0
+            chunk.append(notification)
+            length += added
+        digests.append(self._digest(chunk))
+        return digests
+
+    def _digest(self, chunk: List[Notification]) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Build one digest message with buttons opening the mentioned orders."""
+        if len(chunk) == 1:
+            text, _, reply_markup = chunk[0]
+            return text, reply_markup
+
+        header = get_text(self.language, "admin_digest", count=len(chunk))
+        text = header + "\n\n" + DIGEST_SEPARATOR.join(text for text, _, _ in chunk)
+
+        order_ids = list(dict.fromkeys(order_id for _, order_id, _ in chunk if order_id))
+        if not order_ids:
+            return text, None
+        builder = InlineKeyboardBuilder()
+        builder.add(*(
+            InlineKeyboardButton(text=f"#{order_id}", callback_data=f"admin_digest_order:{order_id}")
+            for order_id in order_ids
+        ))
+        builder.adjust(DIGEST_BUTTONS_PER_ROW)
+        return text, builder.as_markup()
+
+    async def _send(self, text: str, reply_markup: Optional[InlineKeyboardMarkup]):
+        """Send one message, retrying flood control and transient errors."""
+        for attempt in range(self.max_attempts):
+            try:
+                await self.bot.send_message(self.chat_id, text, reply_markup=reply_markup, parse_mode="HTML")
+                return
+            except TelegramRetryAfter as e:
+                self.bucket.pause(e.retry_after)
+                await self.bucket.acquire()
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Bot removed from the chat, malformed text, etc.; retry won't help
+                logger.error(f"Admin notification rejected: {e}")
+                return
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Admin notification failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+        logger.error(f"Admin notification dropped after {self.max_attempts} attempts")
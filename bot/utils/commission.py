@@ -1,13 +1,42 @@
 """Commission calculation utilities."""
-from decimal import Decimal
-from typing import Tuple
+import json
+from bisect import bisect_left
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
+# Settings key holding a JSON tier table overriding DEFAULT_TIERS
+COMMISSION_TIERS_KEY = "commission_tiers"
 
-def calculate_commission(base_amount: Decimal) -> Tuple[Decimal, Decimal]:
-    """
-    Calculate commission based on amount.
+# Lolz payments carry an extra 4%
+LOLZ_MULTIPLIER = Decimal("1.04")
+CENT = Decimal("0.01")
+WHOLE = Decimal("1")
+
+
+class CommissionTier(NamedTuple):
+    """Commission for amounts up to ``up_to`` (inclusive; None = no upper bound)."""
+    up_to: Optional[Decimal]
+    # Percent of the amount
+    rate: Decimal
+    # Commission is never below this (None = no minimum)
+    minimum: Optional[Decimal] = None
+
+
+DEFAULT_TIERS = (
+    CommissionTier(Decimal("10"), Decimal("15.0"), Decimal("1.5")),
+    CommissionTier(Decimal("20"), Decimal("12.0"), Decimal("1.5")),
+    CommissionTier(Decimal("35"), Decimal("10.0")),
+    CommissionTier(Decimal("50"), Decimal("8.0")),
+    CommissionTier(Decimal("75"), Decimal("6.0")),
+    CommissionTier(Decimal("250"), Decimal("5.0")),
+    CommissionTier(None, Decimal("3.0")),
+)
+
+
+class CommissionSchedule:
+    """Tier table searched by binary search on the upper bounds.
 
-    Commission structure:
+    Commission structure (DEFAULT_TIERS):
     - S ≤ $10 → 15%, but not less than $1.5
     - $10 < S ≤ $20 → 12%, but not less than $1.5
     - $20 < S ≤ $35 → 10%
@@ -15,41 +44,99 @@ def calculate_commission(base_amount: Decimal) -> Tuple[Decimal, Decimal]:
     - $50 < S ≤ $75 → 6%
     - $75 < S ≤ $250 → 5%
     - S > $250 → 3%
+    """
+
+    __slots__ = ("tiers", "_bounds")
+
+    def __init__(self, tiers: Sequence[CommissionTier]):
+        tiers = tuple(tiers)
+        if not tiers or tiers[-1].up_to is not None:
+            raise ValueError("Last commission tier must have no upper bound")
+        bounds = [tier.up_to for tier in tiers[:-1]]
+        if None in bounds or any(low >= high for low, high in zip(bounds, bounds[1:])):
+            raise ValueError("Commission tier bounds must be strictly increasing")
+        for tier in tiers:
+            for value in (tier.rate, tier.minimum):
+                if value is not None and (not value.is_finite() or value < 0):
+                    raise ValueError(f"Commission rates and minimums must be non-negative: {tier}")
+        self.tiers = tiers
+        self._bounds = bounds
+
+    def tier(self, base_amount: Decimal) -> CommissionTier:
+        """Get tier of amount."""
+        return self.tiers[bisect_left(self._bounds, base_amount)]
+
+    def quote(self, base_amount: Decimal) -> Tuple[Decimal, Decimal]:
+        """Get (commission_rate, commission_amount) for amount."""
+        _, rate, minimum = self.tiers[bisect_left(self._bounds, base_amount)]
+        commission = base_amount * rate / 100
+        if minimum is not None:
+            commission = max(commission, minimum)
+        return rate, commission
+
+    def quote_many(self, amounts: Iterable[Decimal]) -> List[Tuple[Decimal, Decimal]]:
+        """Quote many amounts at once (e.g. back-testing a tier change on past orders)."""
+        tiers, bounds = self.tiers, self._bounds
+        quotes = []
+        append = quotes.append
+        for base_amount in amounts:
+            _, rate, minimum = tiers[bisect_left(bounds, base_amount)]
+            commission = base_amount * rate / 100
+            if minimum is not None and minimum > commission:
+                commission = minimum
+            append((rate, commission))
+        return quotes
+
+    @classmethod
+    def from_json(cls, value: str) -> "CommissionSchedule":
+        """Parse tier table: [{"up_to": "10", "rate": "15.0", "min": "1.5"}, ..., {"up_to": null, "rate": "3.0"}].
+
+        Raises ValueError on malformed tables.
+        """
+        try:
+            return cls([
+                CommissionTier(
+                    Decimal(str(tier["up_to"])) if tier.get("up_to") is not None else None,
+                    Decimal(str(tier["rate"])),
+                    Decimal(str(tier["min"])) if tier.get("min") is not None else None
+                )
+                for tier in json.loads(value)
+            ])
+        except (TypeError, KeyError, AttributeError, InvalidOperation) as e:
+            raise ValueError(f"Invalid commission tiers: {e}") from e
+
+    def to_json(self) -> str:
+        """Serialize tier table (inverse of from_json)."""
+        return json.dumps([
+            {
+                "up_to": str(tier.up_to) if tier.up_to is not None else None,
+                "rate": str(tier.rate),
+                "min": str(tier.minimum) if tier.minimum is not None else None
+            }
+            for tier in self.tiers
+        ])
+
+
+DEFAULT_SCHEDULE = CommissionSchedule(DEFAULT_TIERS)
+
+
+def calculate_commission(
+    base_amount: Decimal,
+    schedule: CommissionSchedule = DEFAULT_SCHEDULE
+) -> Tuple[Decimal, Decimal]:
+    """
+    Calculate commission based on amount.
 
     Returns:
         Tuple[commission_rate, commission_amount]
     """
-    amount = float(base_amount)
-
-    if amount <= 10:
-        rate = Decimal("15.0")
-        commission = max(base_amount * rate / 100, Decimal("1.5"))
-    elif amount <= 20:
-        rate = Decimal("12.0")
-        commission = max(base_amount * rate / 100, Decimal("1.5"))
-    elif amount <= 35:
-        rate = Decimal("10.0")
-        commission = base_amount * rate / 100
-    elif amount <= 50:
-        rate = Decimal("8.0")
-        commission = base_amount * rate / 100
-    elif amount <= 75:
-        rate = Decimal("6.0")
-        commission = base_amount * rate / 100
-    elif amount <= 250:
-        rate = Decimal("5.0")
-        commission = base_amount * rate / 100
-    else:
-        rate = Decimal("3.0")
-        commission = base_amount * rate / 100
-
-    return rate, commission
+    return schedule.quote(base_amount)
 
 
 def calculate_payment_amount(
     total_amount: Decimal,
     payment_method: str,
-    usd_to_rub_rate: float
+    usd_to_rub_rate: Decimal
 ) -> Tuple[Decimal, str]:
     """
     Calculate payment amount based on payment method.
@@ -63,12 +150,12 @@ def calculate_payment_amount(
         Tuple[payment_amount, currency]
     """
     if payment_method == "CARD":
-        # Convert to RUB and round to whole number
-        payment_amount = Decimal(str(round(float(total_amount) * usd_to_rub_rate)))
+        # Convert to RUB and round to whole number (half to even, like round())
+        payment_amount = (total_amount * usd_to_rub_rate).quantize(WHOLE, rounding=ROUND_HALF_EVEN)
         currency = "RUB"
     elif payment_method == "LOLZ":
         # Add 4% commission for Lolz
-        payment_amount = total_amount * Decimal("1.04")
+        payment_amount = total_amount * LOLZ_MULTIPLIER
         currency = "USD"
     else:  # USDT_TRC20, USDT_BEP20, BYBIT_UID
         # Keep in USD/USDT
@@ -76,6 +163,6 @@ def calculate_payment_amount(
         currency = "USDT"
 
     # Round to 2 decimal places
-    payment_amount = payment_amount.quantize(Decimal("0.01"))
+    payment_amount = payment_amount.quantize(CENT)
 
     return payment_amount, currency
@@ -0,0 +1,216 @@
+"""Update handling metrics in Prometheus text format."""
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Handler label of updates no handler matched
+UNHANDLED = "unhandled"
+
+
+class UpdateTiming:
+    """Time spent on one update, filled in while it is being handled."""
+
+    __slots__ = ("started", "handler", "db", "api")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler = UNHANDLED
+        self.db = 0.0
+        self.api = 0.0
+
+
+# Timing of the update handled in the current task
+_current: ContextVar[Optional[UpdateTiming]] = ContextVar("update_timing", default=None)
+
+
+def start_update() -> UpdateTiming:
+    """Start timing update handled in the current task."""
+    timing = UpdateTiming()
+    _current.set(timing)
+    return timing
+
+
+def current_update() -> Optional[UpdateTiming]:
+    """Get timing of the update handled in the current task (None outside updates)."""
+    return _current.get()
+
+
+def add_db_time(seconds: float):
+    """Attribute database time to the current update."""
+    timing = _current.get()
+    if timing is not None:
+        timing.db += seconds
+
+
+def add_api_time(seconds: float):
+    """Attribute Bot API time to the current update."""
+    timing = _current.get()
+    if timing is not None:
+        timing.api += seconds
+
+
+class Histogram:
+    """Cumulative histogram of observed values."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Add value."""
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """Render _bucket/_sum/_count samples."""
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    """Escape label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Per-handler latency histograms and counters of one bot process.
+
+    Every update is timed end to end, along with the time it spent in the
+    database (through Database) and in Bot API requests. Exceptions that
+    handlers deliberately swallow are counted with swallowed().
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # handler -> (total, db, api)
+        self.handlers: Dict[str, Tuple[Histogram, Histogram, Histogram]] = {}
+        # (handler, result) -> count
+        self.updates: Dict[Tuple[str, str], int] = {}
+        # (where, exception class) -> count
+        self.swallowed_exceptions: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, timing: UpdateTiming, result: str):
+        """Record finished update."""
+        histograms = self.handlers.get(timing.handler)
+        if histograms is None:
+            histograms = self.handlers[timing.handler] = (
+                Histogram(self.buckets), Histogram(self.buckets), Histogram(self.buckets)
+            )
+        total, db, api = histograms
+        total.observe(time.perf_counter() - timing.started)
+        db.observe(timing.db)
+        api.observe(timing.api)
+
+        key = (timing.handler, result)
+        self.updates[key] = self.updates.get(key, 0) + 1
+
+    def swallowed(self, where: str, exception: BaseException):
+        """Count exception handled without re-raising."""
+        key = (where, type(exception).__name__)
+        self.swallowed_exceptions[key] = self.swallowed_exceptions.get(key, 0) + 1
+
+    def render(self, db=None, fx_rates=None, user_repo=None) -> str:
+        """Render all metrics plus state of ``db``, ``fx_rates`` and ``user_repo`` in Prometheus text format."""
+        lines = []
+
+        for name, index, help_text in (
+            ("bot_update_duration_seconds", 0, "Update handling time"),
+            ("bot_update_db_seconds", 1, "Database time per update"),
+            ("bot_update_api_seconds", 2, "Bot API request time per update")
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for handler, histograms in sorted(self.handlers.items()):
+                lines.extend(histograms[index].render(name, f'handler="{_escape(handler)}"'))
+
+        lines.append("# HELP bot_updates_total Handled updates")
+        lines.append("# TYPE bot_updates_total counter")
+        for (handler, result), count in sorted(self.updates.items()):
+            lines.append(f'bot_updates_total{{handler="{_escape(handler)}",result="{result}"}} {count}')
+
+        lines.append("# HELP bot_swallowed_exceptions_total Exceptions handled without re-raising")
+        lines.append("# TYPE bot_swallowed_exceptions_total counter")
+        for (where, exception), count in sorted(self.swallowed_exceptions.items()):
+            lines.append(
+                f'bot_swallowed_exceptions_total{{where="{_escape(where)}",exception="{exception}"}} {count}'
+            )
+
+        if db is not None:
+            pool_stats = db.pool_stats()
+            for key, kind in (
+                ("size", "gauge"),
+                ("idle", "gauge"),
+                ("max_size", "gauge"),
+                ("in_use", "gauge"),
+                ("waiting", "gauge"),
+                ("acquires", "counter"),
+                ("acquire_timeouts", "counter")
+            ):
+                if key in pool_stats:
+                    name = f"bot_db_pool_{key}" + ("_total" if kind == "counter" else "")
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name} {pool_stats[key]}")
+
+            pool_metrics = db.metrics
+            name = "bot_db_pool_acquire_wait_seconds"
+            lines.append(f"# HELP {name} Time waited for a pool connection")
+            lines.append(f"# TYPE {name} histogram")
+            wait = Histogram(pool_metrics.buckets)
+            # PoolMetrics keeps per-bucket counts plus an overflow bucket
+            wait.counts = pool_metrics.bucket_counts[:-1]
+            wait.sum = pool_metrics.acquire_wait_total
+            wait.count = pool_metrics.acquires
+            lines.extend(wait.render(name, ""))
+
+        if user_repo is not None:
+            cache_stats = user_repo.cache_stats()
+            for key, kind, help_text in (
+                ("hits", "counter", "User cache hits"),
+                ("misses", "counter", "User cache misses"),
+                ("invalidations", "counter", "Users dropped from the cache on change notifications"),
+                ("size", "gauge", "Cached users"),
+                ("pending_writes", "gauge", "Profile changes waiting for the background flush")
+            ):
+                name = f"bot_user_cache_{key}" + ("_total" if kind == "counter" else "")
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {cache_stats[key]}")
+
+        if fx_rates is not None:
+            lines.append("# HELP bot_fx_rate USD to RUB rate payments are quoted with")
+            lines.append("# TYPE bot_fx_rate gauge")
+            lines.append(f"bot_fx_rate {fx_rates.rate}")
+            lines.append("# HELP bot_fx_refresh_failures_total Failed exchange rate refreshes")
+            lines.append("# TYPE bot_fx_refresh_failures_total counter")
+            lines.append(f"bot_fx_refresh_failures_total {fx_rates.failures}")
+            age = fx_rates.age
+            # Without a source the configured rate is used as is and never ages
+            if age is not None:
+                lines.append("# HELP bot_fx_rate_age_seconds Time since the rate was last fetched")
+                lines.append("# TYPE bot_fx_rate_age_seconds gauge")
+                lines.append(f"bot_fx_rate_age_seconds {age:.3f}")
+                lines.append("# HELP bot_fx_rate_stale Whether the rate is older than FX_MAX_AGE")
+                lines.append("# TYPE bot_fx_rate_stale gauge")
+                lines.append(f"bot_fx_rate_stale {int(fx_rates.stale)}")
+
+        return "\n".join(lines) + "\n"
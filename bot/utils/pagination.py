@@ -0,0 +1,40 @@
+"""Keyset pagination cursors for callback data."""
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+# Keyset of an order row: (created_at, id)
+Cursor = Tuple[datetime, int]
+
+# Direction markers used in callback data
+NEXT = "n"   # older rows
+PREV = "p"   # newer rows
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _to_base36(value: int) -> str:
+    """Encode non-negative integer in base 36."""
+    if value == 0:
+        return "0"
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(_DIGITS[remainder])
+    return "".join(reversed(digits))
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Encode cursor compactly (callback data is limited to 64 bytes)."""
+    created_at, row_id = cursor
+    return f"{_to_base36((created_at - _EPOCH) // _MICROSECOND)}.{_to_base36(row_id)}"
+
+
+def decode_cursor(value: str) -> Optional[Cursor]:
+    """Decode cursor, returning None for malformed input."""
+    try:
+        created_at, row_id = value.split(".")
+        return _EPOCH + int(created_at, 36) * _MICROSECOND, int(row_id, 36)
+    except ValueError:
+        return None
@@ -0,0 +1,37 @@
+"""Routing of updates to worker processes."""
+from typing import Any, Dict
+
+_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): map key to a bucket in [0, buckets).
+
+    Changing the number of buckets moves only ~1/buckets of the keys.
+    """
+    key &= _MASK
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & _MASK
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """Get id of the user an update comes from (raw Bot API update).
+
+    Falls back to the chat id and, for updates without either, the update id.
+    """
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        for field in ("from", "user"):
+            if isinstance(event.get(field), dict):
+                return event[field]["id"]
+        if isinstance(event.get("chat"), dict):
+            return event["chat"]["id"]
+        # Inline message callbacks etc. carry the message inside
+        if isinstance(event.get("message"), dict) and isinstance(event["message"].get("chat"), dict):
+            return event["message"]["chat"]["id"]
+    return update.get("update_id", 0)
@@ -0,0 +1,35 @@
+"""Startup phase timing."""
+import logging
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Measures consecutive startup phases and logs the breakdown.
+
+    Each mark() closes the phase that started at the previous mark (or at
+    ``started``, e.g. the perf_counter() taken before the heavy imports).
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """Finish phase."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        """Seconds from start to the last mark."""
+        return self._last - self.started
+
+    def log(self):
+        """Log total startup time with per-phase breakdown."""
+        breakdown = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases)
+        logger.info(f"Startup took {self.total * 1000:.0f} ms: {breakdown}")
@@ -1,4 +1,19 @@
-"""Multilingual text messages for the bot."""
+"""Multilingual text messages for the bot.
+
+TEXTS is compiled once at import: every template is parsed into literal
+parts and fields, and every language gets the full key set through its
+fallback chain, so rendering is a single lookup plus a join.
+"""
+import logging
+from string import Formatter
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "ru"
+
+# Languages whose missing keys are taken from another language
+FALLBACKS = {"en": "ru"}
 
 TEXTS = {
     "ru": {
@@ -72,6 +87,8 @@ TEXTS = {
         ),
         "btn_my_orders": "📦 Мои заказы",
         "btn_back": "◀️ Назад",
+        "btn_prev_page": "⬅️ Новее",
+        "btn_next_page": "Старее ➡️",
 
         # Orders list
         "my_orders": "📦 <b>Мои заказы:</b>",
@@ -161,6 +178,7 @@ TEXTS = {
         "btn_complete": "✅ Выполнен",
         "btn_reject": "❌ Отклонить",
         "order_status_updated": "✅ Статус заказа обновлен",
+        "order_status_conflict": "⚠️ Статус заказа уже изменен, показано актуальное состояние",
 
         # Broadcast
         "broadcast_enter_text": "📢 Введите текст рассылки:",
@@ -171,6 +189,14 @@ TEXTS = {
         ),
         "btn_confirm": "✅ Подтвердить",
         "broadcast_sent": "✅ Рассылка отправлена {count} пользователям",
+        "broadcast_started": "📢 Рассылка запущена. Прогресс будет обновляться в этом сообщении.",
+        "broadcast_progress": "📢 Рассылка: отправлено {sent} из {total}, ошибок: {failed}",
+
+        # Users export
+        "users_export": "👥 Активные пользователи: {count}",
+
+        # Admin notification digest
+        "admin_digest": "📬 <b>Уведомлений: {count}</b>",
 
         # Notifications
         "new_order_notification": (
@@ -262,6 +288,8 @@ TEXTS = {
         ),
         "btn_my_orders": "📦 My orders",
         "btn_back": "◀️ Back",
+        "btn_prev_page": "⬅️ Newer",
+        "btn_next_page": "Older ➡️",
 
         # Orders list
         "my_orders": "📦 <b>My orders:</b>",
@@ -351,6 +379,7 @@ TEXTS = {
         "btn_complete": "✅ Complete",
         "btn_reject": "❌ Reject",
         "order_status_updated": "✅ Order status updated",
+        "order_status_conflict": "⚠️ Order status has already changed, showing current state",
 
         # Broadcast
         "broadcast_enter_text": "📢 Enter broadcast text:",
@@ -361,6 +390,14 @@ TEXTS = {
         ),
         "btn_confirm": "✅ Confirm",
         "broadcast_sent": "✅ Broadcast sent to {count} users",
+        "broadcast_started": "📢 Broadcast started. Progress will be updated in this message.",
+        "broadcast_progress": "📢 Broadcast: sent {sent} of {total}, failed: {failed}",
+
+        # Users export
+        "users_export": "👥 Active users: {count}",
+
+        # Admin notification digest
+        "admin_digest": "📬 <b>{count} notifications</b>",
 
         # Notifications
         "new_order_notification": (
@@ -383,12 +420,92 @@ TEXTS = {
 }
 
 
-def get_text(language: str, key: str, **kwargs) -> str:
-    """Get text by language and key with optional formatting."""
-    text = TEXTS.get(language, TEXTS["ru"]).get(key, key)
-    if kwargs:
-        try:
-            return text.format(**kwargs)
-        except KeyError:
-            return text
-    return text
+class Template:
+    """Message template parsed once into literal parts and fields."""
+
+    __slots__ = ("key", "text", "fields", "_parts")
+
+    def __init__(self, key: str, text: str):
+        self.key = key
+        self.text = text
+        parts: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and not field.isidentifier():
+                raise ValueError(f"Text {key!r}: unsupported field {{{field}}}")
+            if spec and "{" in spec:
+                raise ValueError(f"Text {key!r}: nested fields are not supported")
+            parts.append((literal, field, spec, conversion))
+        self.fields: FrozenSet[str] = frozenset(field for _, field, _, _ in parts if field)
+        self._parts = tuple(parts)
+        if not self.fields:
+            # Render result never changes (escaped braces already unescaped)
+            self.text = "".join(literal for literal, _, _, _ in parts)
+
+    def render(self, **kwargs: Any) -> str:
+        """Render template; every field must be passed."""
+        if not self.fields:
+            return self.text
+        if not self.fields.issubset(kwargs):
+            missing = ", ".join(sorted(self.fields.difference(kwargs)))
+            raise TypeError(f"Text {self.key!r} is missing arguments: {missing}")
+
+        chunks = []
+        for literal, field, spec, conversion in self._parts:
+            chunks.append(literal)
+            if field is None:
+                continue
+            value = kwargs[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            chunks.append(format(value, spec) if spec else str(value))
+        return "".join(chunks)
+
+
+def _fallback_chain(language: str) -> List[str]:
+    """Get language followed by its fallbacks."""
+    chain = [language]
+    while chain[-1] in FALLBACKS and FALLBACKS[chain[-1]] not in chain:
+        chain.append(FALLBACKS[chain[-1]])
+    return chain
+
+
+def _compile(texts: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, Template]]:
+    """Compile templates of every language, filling gaps from fallbacks."""
+    compiled = {
+        language: {key: Template(key, text) for key, text in catalog.items()}
+        for language, catalog in texts.items()
+    }
+    resolved = {}
+    for language in compiled:
+        templates: Dict[str, Template] = {}
+        for fallback in reversed(_fallback_chain(language)):
+            templates.update(compiled.get(fallback, {}))
+        resolved[language] = templates
+    return resolved
+
+
+TEMPLATES = _compile(TEXTS)
+
+
+def get_template(language: str, key: str) -> Template:
+    """Get compiled template; unknown languages use DEFAULT_LANGUAGE."""
+    templates = TEMPLATES.get(language) or TEMPLATES[DEFAULT_LANGUAGE]
+    try:
+        return templates[key]
+    except KeyError:
+        raise KeyError(f"Unknown text key: {key!r}") from None
+
+
+def get_text(language: str, key: str, **kwargs: Any) -> str:
+    """Get text by language and key, formatted with kwargs.
+
+    An unknown key or a missing argument is logged and the key itself is
+    returned, so a broken text never breaks a handler.
+    """
+    try:
+        return get_template(language, key).render(**kwargs)
+    except (KeyError, TypeError) as e:
+        logger.error(f"Failed to render text {key!r} ({language}): {e}")
+        return key
@@ -0,0 +1,265 @@
+"""Multi-process mode: a supervisor receiving updates and worker processes handling them."""
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import queue as queue_module
+import signal
+import threading
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from bot.app import (
+    LOG_FORMAT,
+    bot_app,
+    create_bot,
+    include_routers,
+    scale_config,
+    serve_webhook,
+    stop_event
+)
+from bot.config import Config, load_config
+from bot.utils.sharding import jump_hash, update_user_id
+from bot.utils.startup import StartupTimer
+
+logger = logging.getLogger(__name__)
+
+# Spawned workers start from a clean interpreter (no inherited event loop or sockets)
+_context = multiprocessing.get_context("spawn")
+
+# Long polling timeout (seconds)
+POLL_TIMEOUT = 30
+
+# Seconds to spend moving queued updates off a dead worker's queue
+DRAIN_TIMEOUT = 5.0
+
+
+class Supervisor:
+    """Receives updates (polling or webhook) and routes them to worker processes.
+
+    Updates of a user always go to the same worker (jump consistent hash of
+    the sender id), keeping their order and the worker's FSM/user caches
+    warm. Dead workers are restarted with a new queue (the dead process
+    may have left the old one locked or mid-message); updates that can
+    still be read from the old queue are moved over in order.
+    """
+
+    def __init__(self, config: Config, workers: int, shutdown_timeout: float = 30.0):
+        self.config = config
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.queues = [_context.Queue() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        # Updates routed to a worker while its queue is being replaced
+        self._held: Dict[int, List[Dict[str, Any]]] = {}
+        self._stopping = False
+
+    def route(self, update: Dict[str, Any]):
+        """Queue raw update for the worker owning its user."""
+        index = jump_hash(update_user_id(update), self.workers)
+        held = self._held.get(index)
+        if held is not None:
+            held.append(update)
+        else:
+            self.queues[index].put_nowait(update)
+
+    def _spawn(self, index: int):
+        """Start worker process."""
+        process = _context.Process(
+            target=run_worker,
+            args=(index, self.workers, self.queues[index]),
+            name=f"worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def _monitor(self):
+        """Restart workers that died."""
+        while not self._stopping:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if not self._stopping and not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    await self._restart(index)
+
+    async def _restart(self, index: int):
+        """Start worker again on a new queue holding what is left of the old one."""
+        held = self._held[index] = []
+        old = self.queues[index]
+        drained: List[Dict[str, Any]] = []
+        # A read may block forever on a half-written message, so it runs in a
+        # daemon thread that is abandoned after DRAIN_TIMEOUT
+        thread = threading.Thread(target=_drain, args=(old, drained), daemon=True)
+        thread.start()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join, DRAIN_TIMEOUT)
+        if thread.is_alive():
+            logger.error(f"Worker {index} queue is stuck, moved {len(drained)} updates and dropped the rest")
+        drained = list(drained)
+
+        queue = _context.Queue()
+        for update in drained + held:
+            queue.put_nowait(update)
+        self.queues[index] = queue
+        del self._held[index]
+        old.cancel_join_thread()
+        old.close()
+        logger.info(f"Worker {index} restarting with {len(drained) + len(held)} queued updates")
+        self._spawn(index)
+
+    async def run(self):
+        """Run workers and receive updates until SIGINT/SIGTERM."""
+        bot = create_bot(self.config)
+        # Used only to find out which update types the handlers need
+        dp = Dispatcher()
+        include_routers(dp)
+        allowed_updates = dp.resolve_used_update_types()
+
+        for index in range(self.workers):
+            self._spawn(index)
+        monitor = asyncio.create_task(self._monitor())
+        logger.info(f"Supervisor started {self.workers} workers ({self.config.bot.mode})")
+
+        try:
+            if self.config.bot.mode == "webhook":
+                await self._run_webhook(bot, allowed_updates)
+            else:
+                await self._poll(bot, allowed_updates)
+        finally:
+            self._stopping = True
+            monitor.cancel()
+            await self._stop_workers()
+            await bot.session.close()
+
+    async def _poll(self, bot: Bot, allowed_updates: List[str]):
+        """Long-poll getUpdates and route updates."""
+        stopped = stop_event()
+        offset = None
+        backoff = 1.0
+        while not stopped.is_set():
+            request = asyncio.create_task(
+                bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+            )
+            waiter = asyncio.create_task(stopped.wait())
+            await asyncio.wait({request, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if stopped.is_set():
+                request.cancel()
+                break
+
+            try:
+                updates = request.result()
+            except Exception as e:
+                logger.error(f"Failed to get updates: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            for update in updates:
+                self.route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    async def _run_webhook(self, bot: Bot, allowed_updates: List[str]):
+        """Receive updates through the webhook and route them."""
+        secret = self.config.webhook.secret
+
+        async def handle(request: web.Request) -> web.Response:
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, secret):
+                return web.Response(status=401, text="Unauthorized")
+            self.route(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(self.config.webhook.path, handle)
+        await serve_webhook(bot, app, self.config.webhook, secret, allowed_updates)
+
+    async def _stop_workers(self):
+        """Let workers finish queued updates, then stop them."""
+        for queue in self.queues:
+            queue.put(None)
+
+        loop = asyncio.get_running_loop()
+        for index, process in enumerate(self.processes):
+            await loop.run_in_executor(None, process.join, self.shutdown_timeout)
+            if process.is_alive():
+                logger.error(f"Worker {index} did not stop in time, terminating")
+                process.terminate()
+
+
+def _drain(queue, into: List[Dict[str, Any]]):
+    """Move updates from a dead worker's queue into a list until it is empty."""
+    try:
+        while True:
+            update = queue.get(timeout=0.1)
+            if update is not None:
+                into.append(update)
+    except queue_module.Empty:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to read dead worker queue: {e}")
+
+
+def run_worker(index: int, workers: int, queue):
+    """Worker process entry point."""
+    # Ctrl+C reaches the whole process group; the supervisor stops workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    asyncio.run(Worker(index, workers, queue).run())
+
+
+class Worker:
+    """Handles updates routed to one worker process."""
+
+    def __init__(self, index: int, workers: int, queue):
+        self.index = index
+        self.workers = workers
+        self.queue = queue
+        # Last task per user: a user's updates are handled one after another
+        self._last: Dict[int, asyncio.Task] = {}
+
+    async def run(self):
+        """Set up the bot with this worker's share of resources and consume updates."""
+        timer = StartupTimer()
+        config = scale_config(load_config(), self.workers)
+        if config.metrics.port:
+            config = replace(config, metrics=replace(config.metrics, port=config.metrics.port + self.index))
+        bot = create_bot(config)
+        loop = asyncio.get_running_loop()
+
+        async with bot_app(config, bot, timer) as dp:
+            logger.info(f"Worker {self.index} ready (pool max {config.db.pool_max_size})")
+            while True:
+                update = await loop.run_in_executor(None, self.queue.get)
+                if update is None:
+                    break
+                user_id = update_user_id(update)
+                task = asyncio.create_task(self._handle(dp, bot, update, self._last.get(user_id)))
+                self._last[user_id] = task
+                task.add_done_callback(lambda done, key=user_id: self._forget(key, done))
+
+            await asyncio.gather(*self._last.values(), return_exceptions=True)
+        logger.info(f"Worker {self.index} stopped")
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        """Drop finished task unless a newer one for the user is queued."""
+        if self._last.get(user_id) is task:
+            del self._last[user_id]
+
+    async def _handle(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        update: Dict[str, Any],
+        previous: Optional[asyncio.Task]
+    ):
+        """Handle update after the user's previous one."""
+        if previous:
+            await asyncio.wait({previous})
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception(f"Failed to handle update {update.get('update_id')}")
@@ -1,85 +1,62 @@
 """Main bot entry point."""
+import time
+
+# Startup is timed from here, the imports below (aiogram) are its largest part
+STARTED = time.perf_counter()
+
 import asyncio
 import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from bot.config import load_config
-from bot.database.db import Database
-from bot.models.user import UserRepository
-from bot.models.order import OrderRepository
-from bot.models.settings import SettingsRepository
-from bot.middlewares.user_check import UserCheckMiddleware
-from bot.filters.admin import AdminFilter
-
-# Import handlers
-from bot.handlers import common, payment, profile, admin
+from bot.app import LOG_FORMAT, bot_app, create_bot, serve_webhook
+from bot.config import load_config, WebhookConfig
+from bot.utils.startup import StartupTimer
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format=LOG_FORMAT
 )
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Main bot function."""
-    # Load configuration
-    config = load_config()
+async def run_webhook(bot: Bot, dp: Dispatcher, config: WebhookConfig):
+    """Receive updates through a webhook served by an embedded aiohttp server."""
+    secret = config.secret
 
-    # Initialize bot and dispatcher
-    bot = Bot(
-        token=config.bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher()
+    app = web.Application()
+    # Updates are processed in background tasks, Telegram gets 200 right away
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=config.path)
+    setup_application(app, dp, bot=bot)
 
-    # Initialize database
-    db = Database(config.db.dsn)
-    await db.connect()
+    await serve_webhook(bot, app, config, secret, dp.resolve_used_update_types())
 
-    # Initialize repositories
-    user_repo = UserRepository(db)
-    order_repo = OrderRepository(db)
-    settings_repo = SettingsRepository(db)
 
-    # Initialize admin filter
-    admin_filter = AdminFilter(config.bot.admin_ids)
-
-    # Register middlewares
-    common.router.message.middleware(UserCheckMiddleware(user_repo))
-    common.router.callback_query.middleware(UserCheckMiddleware(user_repo))
-    payment.router.message.middleware(UserCheckMiddleware(user_repo))
-    payment.router.callback_query.middleware(UserCheckMiddleware(user_repo))
-    profile.router.callback_query.middleware(UserCheckMiddleware(user_repo))
-    admin.router.message.middleware(UserCheckMiddleware(user_repo))
-    admin.router.callback_query.middleware(UserCheckMiddleware(user_repo))
+async def main():
+    """Main bot function."""
+    timer = StartupTimer(STARTED)
+    timer.mark("imports")
 
-    # Register routers
-    dp.include_router(common.router)
-    dp.include_router(payment.router)
-    dp.include_router(profile.router)
-    dp.include_router(admin.router)
+    # Load configuration
+    config = load_config()
 
-    # Set data to all handlers
-    dp.workflow_data.update({
-        "config": config,
-        "db": db,
-        "user_repo": user_repo,
-        "order_repo": order_repo,
-        "settings_repo": settings_repo,
-        "admin_filter": admin_filter
-    })
+    if config.bot.workers > 1:
+        # multiprocessing machinery is only needed in worker mode
+        from bot.workers import Supervisor
+        await Supervisor(config, config.bot.workers).run()
+        return
 
-    # Start polling
-    try:
-        logger.info("Bot started")
-        await dp.start_polling(bot)
-    finally:
-        await db.disconnect()
-        await bot.session.close()
+    # Initialize bot, database, services and dispatcher
+    bot = create_bot(config)
+    async with bot_app(config, bot, timer) as dp:
+        # Start receiving updates
+        logger.info(f"Bot started ({config.bot.mode})")
+        if config.bot.mode == "webhook":
+            await run_webhook(bot, dp, config.webhook)
+        else:
+            await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
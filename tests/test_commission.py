@@ -0,0 +1,67 @@
+"""Commission table checks against the if/elif ladder it replaced."""
+import random
+from decimal import Decimal
+from typing import List
+
+import pytest
+
+from benchmarks.commission import legacy_calculate_commission
+from bot.utils.commission import DEFAULT_SCHEDULE, CommissionSchedule, CommissionTier
+
+
+def boundary_amounts() -> List[Decimal]:
+    """Tier bounds and amounts just below/above them."""
+    amounts = []
+    for tier in DEFAULT_SCHEDULE.tiers[:-1]:
+        # Beyond 12 decimal places the old float comparison itself rounds onto the bound
+        for places in range(0, 13):
+            epsilon = Decimal(1).scaleb(-places)
+            amounts.extend((tier.up_to - epsilon, tier.up_to, tier.up_to + epsilon))
+        amounts.extend((tier.up_to.quantize(Decimal("0.01")), tier.up_to.quantize(Decimal("0.00001"))))
+    return amounts
+
+
+def cent_amounts(maximum: int = 1000) -> List[Decimal]:
+    """Every cent amount from -1 up to maximum."""
+    return [Decimal(cents).scaleb(-2) for cents in range(-100, maximum * 100 + 1)]
+
+
+def random_amounts(count: int = 10000) -> List[Decimal]:
+    """Amounts with up to 6 decimal places."""
+    rng = random.Random(0)
+    return [Decimal(rng.randrange(1, 10 ** 9)).scaleb(-rng.randrange(0, 7)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("amounts", [boundary_amounts, cent_amounts, random_amounts])
+def test_schedule_matches_legacy_ladder(amounts):
+    amounts = amounts()
+    batch = DEFAULT_SCHEDULE.quote_many(amounts)
+    for amount, quoted in zip(amounts, batch):
+        # Same values and same Decimal exponents
+        expected = tuple(map(str, legacy_calculate_commission(amount)))
+        assert tuple(map(str, DEFAULT_SCHEDULE.quote(amount))) == expected, amount
+        assert tuple(map(str, quoted)) == expected, amount
+
+
+def test_json_round_trip():
+    assert CommissionSchedule.from_json(DEFAULT_SCHEDULE.to_json()).tiers == DEFAULT_SCHEDULE.tiers
+
+
+@pytest.mark.parametrize("value", [
+    '[{"up_to": null, "rate": "-3.0"}]',
+    '[{"up_to": "10", "rate": "15.0", "min": "-1.5"}, {"up_to": null, "rate": "3.0"}]',
+    '[{"up_to": "20", "rate": "5"}, {"up_to": "10", "rate": "5"}, {"up_to": null, "rate": "3.0"}]',
+    '[{"up_to": "10", "rate": "5"}]',
+    '[{"up_to": null, "rate": "NaN"}]',
+    '[{"up_to": null}]',
+    '{"rate": "3.0"}',
+    'not json',
+])
+def test_from_json_rejects_invalid_tables(value):
+    with pytest.raises(ValueError):
+        CommissionSchedule.from_json(value)
+
+
+def test_negative_tier_rejected():
+    with pytest.raises(ValueError):
+        CommissionSchedule([CommissionTier(None, Decimal("3.0"), Decimal("-1"))])
@@ -0,0 +1,31 @@
+"""Cached keyboards: equal on every call, not changeable through a caller."""
+import pytest
+from aiogram.types import InlineKeyboardButton
+from pydantic import ValidationError
+
+from bot.keyboards.inline import get_main_menu, get_order_admin_actions, prewarm
+from bot.models.order import OrderStatus
+
+
+@pytest.mark.parametrize("get_keyboard, args", [
+    (get_main_menu, ("en",)),
+    (get_order_admin_actions, ("ru", 1, OrderStatus.PENDING)),
+])
+def test_cached_keyboard_is_equal_and_immutable(get_keyboard, args):
+    first = get_keyboard(*args)
+    second = get_keyboard(*args)
+    assert first == second
+    assert get_keyboard.cache_info().hits >= 1
+
+    with pytest.raises(ValidationError):
+        first.inline_keyboard[0][0].text = "changed"
+
+    # Rows of the returned markup are its own
+    first.inline_keyboard.append([InlineKeyboardButton(text="extra", callback_data="extra")])
+    first.inline_keyboard[0].clear()
+    assert get_keyboard(*args) == second
+
+
+def test_prewarm_builds_static_keyboards():
+    prewarm(["en"])
+    assert get_main_menu.cache_info().currsize >= 1
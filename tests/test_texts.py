@@ -0,0 +1,81 @@
+"""Text catalog checks: every template renders, every call site passes its fields."""
+import ast
+from pathlib import Path
+
+import pytest
+
+from bot.utils.texts import TEMPLATES, TEXTS, get_template, get_text
+
+SOURCE_ROOT = Path(__file__).resolve().parent.parent / "bot"
+
+
+def sample_value(spec: str):
+    """Value accepted by a field with the given format spec."""
+    if spec.endswith("d"):
+        return 1
+    if spec:
+        return 1.5
+    return "x"
+
+
+def sample_kwargs(template):
+    return {
+        field: sample_value(spec)
+        for _, field, spec, _ in template._parts
+        if field
+    }
+
+
+@pytest.mark.parametrize("language", sorted(TEMPLATES))
+def test_every_template_renders(language):
+    for key, template in TEMPLATES[language].items():
+        # render() raises on a missing field; get_text() would only log it
+        assert template.render(**sample_kwargs(template)), key
+
+
+def test_get_text_returns_key_on_error():
+    assert get_text("en", "no_such_key") == "no_such_key"
+    assert get_text("en", "admin_digest") == "admin_digest"
+
+
+def test_languages_have_same_fields():
+    languages = sorted(TEXTS)
+    for key in set().union(*(TEXTS[language] for language in languages)):
+        fields = {
+            language: TEMPLATES[language][key].fields
+            for language in languages
+            if key in TEMPLATES[language]
+        }
+        assert len(set(fields.values())) == 1, f"{key}: {fields}"
+
+
+def get_text_calls():
+    """(location, key, keyword names) of get_text calls with a constant key."""
+    calls = []
+    for path in sorted(SOURCE_ROOT.rglob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        for node in ast.walk(tree):
+            if not (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Name)
+                and node.func.id == "get_text"
+                and len(node.args) >= 2
+                and isinstance(node.args[1], ast.Constant)
+            ):
+                continue
+            # get_text(..., **data) cannot be checked statically
+            if any(keyword.arg is None for keyword in node.keywords):
+                continue
+            location = f"{path.relative_to(SOURCE_ROOT.parent)}:{node.lineno}"
+            calls.append((location, node.args[1].value, {keyword.arg for keyword in node.keywords}))
+    return calls
+
+
+def test_call_sites_pass_every_field():
+    calls = get_text_calls()
+    assert calls
+    for location, key, passed in calls:
+        for language in TEMPLATES:
+            fields = get_template(language, key).fields
+            assert fields <= passed, f"{location}: {key!r} ({language}) misses {sorted(fields - passed)}"
+            assert passed <= fields, f"{location}: {key!r} ({language}) has unused {sorted(passed - fields)}"